@@ -1,20 +1,84 @@
+import argparse
 import numpy as np
-import csv
+import os
+import shutil
+import tempfile
 import time
 import random
 
+from attempt_store import read_log, open_store
+from progress_db import ProgressDB, PROGRESS_DB
+
+N_STATES = 100
+N_ACTIONS = 10  # difficulty levels 0-9 (logged as 1-10)
+
+# One checkpoint per learner and course: checkpoints/<learner id>/<course>.npy
+CHECKPOINT_DIR = os.environ.get("SKILLSPROUT_CHECKPOINT_DIR", "checkpoints")
+CHECKPOINT_VERSION = 1
+CHECKPOINT_DTYPE = np.dtype([
+    ("version", "<i4"),
+    ("epsilon", "<f8"),
+    ("correct_streak", "<i8"),
+    ("total_correct", "<i8"),
+    ("time_spent", "<f8"),
+    ("total_questions", "<i8"),
+    ("q_table", "<f8", (N_STATES, N_ACTIONS)),
+])
+_STATE_FIELDS = ("correct_streak", "total_correct", "time_spent", "total_questions")
+
+
+def difficulty_for_action(action):
+    """Question difficulty (1-10) asked for by a Q-table action (0-9)."""
+    return int(action) + 1
+
+
+def action_for_difficulty(difficulty):
+    """Q-table action (0-9) of a question difficulty (1-10); scalars or arrays, clipped into range."""
+    action = np.clip(np.asarray(difficulty, dtype=np.int64) - 1, 0, N_ACTIONS - 1)
+    return action if action.ndim else int(action)
+
+
+def checkpoint_path(learner_id, course):
+    return os.path.join(CHECKPOINT_DIR, str(learner_id), f"{course}.npy")
+
+
+def write_checkpoint(path, checkpoint):
+    """
+    Atomically replace the checkpoint at `path`: readers (and a crash
+    halfway through) see either the old file or the new one.
+    """
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, checkpoint)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def delete_checkpoints(learner_id):
+    """Remove every checkpoint of a learner (learner ids can be reused after deletion)."""
+    shutil.rmtree(os.path.join(CHECKPOINT_DIR, str(learner_id)), ignore_errors=True)
+
 class AdaptiveDifficultyQlearning:
-    def __init__(self, learning_rate=0.1, discount_factor=0.9, epsilon=0.9, epsilon_decay=0.995, epsilon_min=0.1, csv_file='user_data.csv'):
+    def __init__(self, learning_rate=0.1, discount_factor=0.9, epsilon=0.9, epsilon_decay=0.995, epsilon_min=0.1, csv_file='user_data.csv', attempt_store=None):
         # Initialize parameters
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.epsilon = epsilon
         self.epsilon_decay = epsilon_decay
         self.epsilon_min = epsilon_min
-        self.csv_file = csv_file
+        self.csv_file = csv_file  # standalone log to train on when there is no attempt_store
+        self.attempt_store = attempt_store  # a learner's AttemptStore in the app
         
         # Initialize the Q-table (100 unique states and 10 possible difficulties)
-        self.q_table = np.zeros((100, 10))  # Assuming 100 possible states, 10 difficulty levels (0-9)
+        self.q_table = np.zeros((N_STATES, N_ACTIONS))  # Assuming 100 possible states, 10 difficulty levels (0-9)
         self.state = 0  # Initial state (this will change based on user progress)
         self.reset_state()  # Initialize user-specific state
 
@@ -27,6 +91,11 @@ class AdaptiveDifficultyQlearning:
             'total_questions': 0
         }
 
+    @staticmethod
+    def state_index(total_questions):
+        """Q-table row of a state; learners past N_STATES - 1 questions share the last row."""
+        return np.minimum(total_questions, N_STATES - 1)
+
     def choose_action(self):
         """Select an action using epsilon-greedy policy."""
         if random.uniform(0, 1) < self.epsilon:
@@ -34,126 +103,217 @@ class AdaptiveDifficultyQlearning:
             action = random.randint(0, 9)
         else:
             # Exploitation: choose the best action (difficulty level)
-            action = np.argmax(self.q_table[self.state['total_questions']])
+            action = np.argmax(self.q_table[self.state_index(self.state['total_questions'])])
         
         return action
 
     def update_q_table(self, action, reward, next_state):
         """Update the Q-table using the Q-learning formula."""
-        current_q_value = self.q_table[self.state['total_questions'], action]
-        max_future_q = np.max(self.q_table[next_state['total_questions']])
+        row = self.state_index(self.state['total_questions'])
+        current_q_value = self.q_table[row, action]
+        max_future_q = np.max(self.q_table[self.state_index(next_state['total_questions'])])
         
         # Q-learning formula
         new_q_value = current_q_value + self.learning_rate * (reward + self.discount_factor * max_future_q - current_q_value)
-        self.q_table[self.state['total_questions'], action] = new_q_value
+        self.q_table[row, action] = new_q_value
 
         # Update state for next iteration
         self.state = next_state
 
     def calculate_reward(self, correct, time_spent, streak, question_type=0):
-        """Reward function based on correctness, time, streak, and type."""
-        base_reward = 10 if correct else -5
-        time_bonus = max(0, 10 - time_spent)
-        streak_bonus = streak * 1.5
+        """
+        Reward function based on correctness, time, streak, and type. Takes
+        scalars or equal-length arrays (one reward per attempt).
+        """
+        correct = np.asarray(correct, dtype=bool)
+        base_reward = np.where(correct, 10.0, -5.0)
+        time_bonus = np.maximum(0.0, 10.0 - np.asarray(time_spent, dtype=float))
+        streak_bonus = np.asarray(streak, dtype=float) * 1.5
 
         # Optional: give slightly higher reward for correct numeric answers
-        type_bonus = 2 if (correct and question_type == 0) else 0
-
-        return base_reward + time_bonus + streak_bonus + type_bonus
+        type_bonus = np.where(correct & (np.asarray(question_type) == 0), 2.0, 0.0)
 
+        reward = base_reward + time_bonus + streak_bonus + type_bonus
+        return reward if reward.ndim else float(reward)
 
-    def log_data(self, difficulty, correct, time_spent, streak):
-        """Log data into CSV file for tracking."""
-        # Define the CSV file name
-        file_name = self.csv_file
 
-        # Define the column headers (if the file is new)
-        fieldnames = [
-            'time_on_question', 'difficulty', 'topic',
-            'question_type', 'submitted_answer', 'correct_answer',
-            'correct', 'correct_streak'
-        ]
+    def log_data(self, difficulty, correct, time_spent, streak=None, topic=0, question_type=0,
+                 submitted_answer=0.0, correct_answer=0.0, question_id=-1, seed=None):
+        """
+        Log one attempt to the learner's AttemptStore, the only writer of
+        attempt logs. The store keeps the running correct_streak itself, so
+        `streak` is ignored (it is accepted for older callers).
+        """
+        if self.attempt_store is None:
+            raise ValueError("log_data needs an attempt_store (see attempt_store.open_store)")
+        self.attempt_store.record(
+            time_on_question=time_spent,
+            difficulty=difficulty_for_action(difficulty),
+            topic=topic,
+            question_type=question_type,
+            submitted_answer=submitted_answer,
+            correct_answer=correct_answer,
+            correct=correct,
+            question_id=question_id,
+            seed=seed,
+        )
 
-        # Check if the file exists
-        file_exists = os.path.isfile(file_name)
+    def load_history(self):
+        """The logged attempts as a structured array (see attempt_store.ATTEMPT_DTYPE)."""
+        if self.attempt_store is not None:
+            return self.attempt_store.history()
+        history = read_log(self.csv_file)
+        if not len(history):
+            print("CSV file not found, starting a new log.")
+        return history
 
-        # Open the CSV file in append mode
-        with open(file_name, mode='a', newline='') as file:
-            writer = csv.DictWriter(file, fieldnames=fieldnames)
+    def load_csv(self):
+        """Load the logged attempts as a list of (difficulty, correct, time, streak)."""
+        history = self.load_history()
+        return list(zip(history["difficulty"].tolist(),
+                        (history["correct"] == 1).tolist(),
+                        history["time_on_question"].tolist(),
+                        history["correct_streak"].tolist()))
 
-            # If file does not exist, write the header first
-            if not file_exists:
-                writer.writeheader()
+    def checkpoint(self):
+        """A snapshot of the Q-table, epsilon and state as one CHECKPOINT_DTYPE record."""
+        if isinstance(self.q_table, np.memmap):
+            # Stop reading through the loaded file so it can be replaced (Windows refuses
+            # to replace a mapped file)
+            self.q_table = np.array(self.q_table)
+        checkpoint = np.zeros(1, dtype=CHECKPOINT_DTYPE)
+        checkpoint["version"] = CHECKPOINT_VERSION
+        checkpoint["epsilon"] = self.epsilon
+        for field in _STATE_FIELDS:
+            checkpoint[field] = self.state.get(field, 0)
+        checkpoint["q_table"] = self.q_table
+        return checkpoint
 
-            # Append the user data as a new row
-            writer.writerow({
-                'difficulty': difficulty + 1,  # Store difficulty 1-10
-                'correct': 1 if correct else 0,  # Store correct answer as 1/0
-                'time_on_question': time_spent,
-                'submitted_answer': 'user_answer',  # Placeholder, change accordingly
-                'correct_answer': 'correct_answer',  # Placeholder, change accordingly
-                'correct_streak': streak
-            })
+    def save_checkpoint(self, path):
+        write_checkpoint(path, self.checkpoint())
 
-    def load_csv(self):
-        """Load CSV data into a list, with error handling for invalid rows."""
-        data = []
+    def load_checkpoint(self, path):
+        """
+        Resume from a checkpoint written by save_checkpoint. The Q-table is
+        memory-mapped copy-on-write, so updates stay in memory until the
+        next save. Returns False (leaving the agent as it was) if there is
+        no usable checkpoint.
+        """
+        if not os.path.exists(path):
+            return False
         try:
-            with open(self.csv_file, 'r') as file:
-                reader = csv.DictReader(file)
-                for row in reader:
-                    try:
-                        difficulty = int(row.get('difficulty', 0))
-                        correct = int(row.get('correct', 0)) == 1
-                        time_spent = float(row.get('time_on_question', 0))
-                        streak = int(row.get('correct_streak', 0))
-                        # You could also read question_type here if needed later:
-                        # qtype = int(row.get('question_type', 0))
-
-                        data.append((difficulty, correct, time_spent, streak))
-                    except (ValueError, TypeError):
-                        print(f"Skipping invalid row: {row}")
-        except FileNotFoundError:
-            print("CSV file not found, starting a new log.")
-        return data
+            checkpoint = np.load(path, mmap_mode="c")
+            if checkpoint.dtype.names is None or "version" not in checkpoint.dtype.names:
+                raise ValueError("not a Q-table checkpoint")
+            version = int(checkpoint["version"][0])
+            if version != CHECKPOINT_VERSION:
+                raise ValueError(f"checkpoint version {version}, expected {CHECKPOINT_VERSION}")
+            if checkpoint.dtype != CHECKPOINT_DTYPE:
+                raise ValueError("checkpoint layout does not match this version")
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring Q-table checkpoint {path}: {e}")
+            return False
 
-    def train_with_csv_data(self):
-        """Train the model with existing data from the CSV."""
-        data = self.load_csv()
-        
-        for row in data:
-            difficulty, correct, time_spent, streak = row
-
-            # Calculate reward based on the data
-            reward = self.calculate_reward(correct, time_spent, streak)
-            
-            # Simulate user state update
-            next_state = self.state.copy()
-            next_state['total_questions'] += 1
-            if correct:
-                next_state['total_correct'] += 1
-                next_state['correct_streak'] += 1
-            else:
-                next_state['correct_streak'] = 0
-            
-            # Update Q-table using the state, action, and reward
-            self.update_q_table(difficulty, reward, next_state)
-            
-            # Decay epsilon for exploration vs exploitation
+        record = checkpoint[0]
+        self.q_table = checkpoint["q_table"][0]
+        self.epsilon = float(record["epsilon"])
+        self.state = {field: record[field].item() for field in _STATE_FIELDS}
+        return True
+
+    def train_with_csv_data(self, epochs=1, batch_size=1024, shuffle=True, seed=None, verbose=True):
+        """
+        Train the model on the logged attempts. The log is read into arrays
+        once and every reward computed in one pass; each epoch then replays
+        it in minibatches of `batch_size` transitions (shuffled unless
+        `shuffle` is False), and an epoch with batch_size=1 and no shuffling
+        is the classic row-by-row update.
+        """
+        history = self.load_history()
+        n = len(history)
+        if not n:
+            return
+
+        # Replay starts from a new learner: row i moves from state i to i + 1
+        states = self.state_index(np.arange(n))
+        next_states = self.state_index(np.arange(1, n + 1))
+        actions = action_for_difficulty(history["difficulty"])
+        correct = history["correct"] == 1
+        rewards = self.calculate_reward(correct, history["time_on_question"], history["correct_streak"],
+                                        history["question_type"])
+        cells = states * N_ACTIONS + actions
+
+        rng = np.random.default_rng(seed)
+        q = self.q_table.reshape(-1)  # a view: updates land in q_table
+        for epoch in range(1, epochs + 1):
+            started = time.perf_counter()
+            order = rng.permutation(n) if shuffle else np.arange(n)
+            abs_error = 0.0
+            for start in range(0, n, batch_size):
+                batch = order[start:start + batch_size]
+                targets = rewards[batch] + self.discount_factor * self.q_table[next_states[batch]].max(axis=1)
+                errors = targets - q[cells[batch]]
+                abs_error += np.abs(errors).sum()
+
+                # Transitions sharing a (state, action) cell move it by their mean error
+                error_sum = np.bincount(cells[batch], weights=errors, minlength=q.size)
+                counts = np.bincount(cells[batch], minlength=q.size)
+                touched = counts > 0
+                q[touched] += self.learning_rate * error_sum[touched] / counts[touched]
+
+            # Decay epsilon as if each attempt had been replayed one at a time
             if self.epsilon > self.epsilon_min:
-                self.epsilon *= self.epsilon_decay
+                self.epsilon = max(self.epsilon_min, self.epsilon * self.epsilon_decay ** n)
+            if verbose:
+                elapsed = time.perf_counter() - started
+                print(f"Epoch {epoch}/{epochs}: {n} attempts, mean |TD error| {abs_error / n:.3f} "
+                      f"({n / max(elapsed, 1e-9):,.0f} attempts/s)")
 
+        # Leave the agent where the replayed learner ended up
+        last_wrong = np.flatnonzero(~correct)
+        self.state = {
+            'correct_streak': int(n - 1 - last_wrong[-1]) if len(last_wrong) else n,
+            'total_correct': int(correct.sum()),
+            'time_spent': 0,
+            'total_questions': n
+        }
         print("Training complete with existing CSV data.")
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Train the Q-learning agent on logged attempts")
+    parser.add_argument("csv_file", nargs="?", default="user_data.csv")
+    parser.add_argument("--learner", help="Train on this learner's attempts in the progress database instead")
+    parser.add_argument("--course", help="Course of --learner's attempts")
+    parser.add_argument("--db", default=PROGRESS_DB)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=1024)
+    parser.add_argument("--seed", type=int, help="Seed for the replay order")
+    parser.add_argument("--save", action="store_true",
+                        help="Save the trained agent as --learner's checkpoint for --course")
+    args = parser.parse_args()
+
+    store = None
+    if args.learner:
+        if not args.course:
+            parser.error("--learner needs --course")
+        progress_db = ProgressDB(args.db)
+        learner_id = progress_db.learner_id(args.learner)
+        if learner_id is None:
+            parser.error(f"no learner named '{args.learner}'")
+        store = open_store(learner_id, args.course, progress_db)
+    elif args.save:
+        parser.error("--save needs --learner")
+
     # Initialize the Q-learning agent
-    agent = AdaptiveDifficultyQlearning(csv_file='user_data.csv')
+    agent = AdaptiveDifficultyQlearning(csv_file=args.csv_file, attempt_store=store)
 
-    # Train the model with the existing data in CSV
-    agent.train_with_csv_data()
+    # Train the model with the logged data
+    agent.train_with_csv_data(epochs=args.epochs, batch_size=args.batch_size, seed=args.seed)
 
     # After training, print out the Q-table for inspection
     print(agent.q_table)
-
-    # Optionally, you can load and check logged data
-    print(agent.load_csv())
+    if store is not None:
+        store.close()
+    if args.save:
+        path = checkpoint_path(learner_id, args.course)
+        agent.save_checkpoint(path)
+        print(f"✅ Saved checkpoint {path}")
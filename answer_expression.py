@@ -0,0 +1,168 @@
+import ast
+import keyword
+import math
+import re
+from functools import lru_cache, reduce
+
+import numpy as np
+
+# "{a} * {c} + {b}" -> parameter names a, c, b
+PLACEHOLDER_RE = re.compile(r"\{(\w+)\}")
+
+# Names a template may use without braces
+MATH_NAMES = {
+    name: getattr(math, name)
+    for name in (
+        "sqrt", "exp", "log", "log10", "log2",
+        "sin", "cos", "tan", "asin", "acos", "atan", "atan2",
+        "sinh", "cosh", "tanh", "degrees", "radians",
+        "floor", "ceil", "fabs", "factorial", "hypot",
+        "pi", "e", "tau",
+    )
+}
+MATH_NAMES.update({"abs": abs, "round": round, "min": min, "max": max})
+
+# NumPy equivalents used when evaluating over parameter arrays
+NUMPY_NAMES = {
+    "sqrt": np.sqrt, "exp": np.exp, "log": np.log, "log10": np.log10, "log2": np.log2,
+    "sin": np.sin, "cos": np.cos, "tan": np.tan,
+    "asin": np.arcsin, "acos": np.arccos, "atan": np.arctan, "atan2": np.arctan2,
+    "sinh": np.sinh, "cosh": np.cosh, "tanh": np.tanh,
+    "degrees": np.degrees, "radians": np.radians,
+    "floor": np.floor, "ceil": np.ceil, "fabs": np.fabs,
+    "factorial": np.vectorize(lambda x: float(math.factorial(int(x))), otypes=[float]),
+    "hypot": np.hypot,
+    "pi": np.pi, "e": np.e, "tau": 2 * np.pi,
+    "abs": np.abs, "round": np.round,
+    "min": lambda *args: reduce(np.minimum, args),
+    "max": lambda *args: reduce(np.maximum, args),
+}
+
+ALLOWED_BINOPS = (ast.Add, ast.Sub, ast.Mult, ast.Div, ast.FloorDiv, ast.Mod, ast.Pow)
+ALLOWED_UNARYOPS = (ast.UAdd, ast.USub)
+
+
+class AnswerExpressionError(ValueError):
+    """Raised when a correct_answer template is not a valid arithmetic expression."""
+
+
+class AnswerExpression:
+    """
+    A correct_answer template compiled once into a plain Python function.
+
+    The template is parsed into an AST, checked so that it only contains
+    numbers, arithmetic, math functions and its own {param} placeholders,
+    and then compiled into `lambda <params>: <expr>`. Calling it never goes
+    through str.format or eval.
+    """
+
+    def __init__(self, template, param_names, tree):
+        self.template = template
+        self.param_names = param_names
+        self._tree = tree
+        self._func = _build_function(tree, param_names, MATH_NAMES)
+        self._array_func = None
+
+    def __call__(self, params):
+        """Evaluate the expression for a {name: value} mapping."""
+        try:
+            args = [params[name] for name in self.param_names]
+        except KeyError as e:
+            raise AnswerExpressionError(f"missing value for parameter {e}") from None
+        return self._func(*args)
+
+    def evaluate_array(self, params):
+        """
+        Evaluate the expression element-wise over {name: array} parameters,
+        returning a float array. Invalid operations yield inf/nan rather
+        than raising.
+        """
+        if self._array_func is None:
+            self._array_func = _build_function(self._tree, self.param_names, NUMPY_NAMES)
+        try:
+            args = [np.asarray(params[name], dtype=float) for name in self.param_names]
+        except KeyError as e:
+            raise AnswerExpressionError(f"missing value for parameter {e}") from None
+        with np.errstate(all="ignore"):
+            result = self._array_func(*args)
+        return np.asarray(result, dtype=float)
+
+    def __reduce__(self):
+        # Recompile from the template when pickled (e.g. into a process pool)
+        return compile_answer_expression, (self.template,)
+
+    def __deepcopy__(self, memo):
+        # Compiled expressions are immutable; share them between copies
+        return self
+
+    def __repr__(self):
+        return f"AnswerExpression({self.template!r})"
+
+
+def _build_function(tree, param_names, namespace):
+    args = ast.arguments(
+        posonlyargs=[],
+        args=[ast.arg(arg=name) for name in param_names],
+        kwonlyargs=[], kw_defaults=[], defaults=[]
+    )
+    lam = ast.Expression(body=ast.Lambda(args=args, body=tree.body))
+    ast.fix_missing_locations(lam)
+    try:
+        code = compile(lam, "<correct_answer>", "eval")
+    except SyntaxError as e:
+        raise AnswerExpressionError(f"cannot compile correct_answer: {e.msg}") from None
+    return eval(code, {"__builtins__": {}, **namespace})
+
+
+def _validate(node, param_names, template):
+    """Walk the AST and reject anything that is not plain arithmetic."""
+    for child in ast.walk(node):
+        if isinstance(child, (ast.Expression, ast.Load)):
+            continue
+        if isinstance(child, ast.BinOp):
+            if not isinstance(child.op, ALLOWED_BINOPS):
+                raise AnswerExpressionError(
+                    f"operator '{type(child.op).__name__}' is not allowed in '{template}'")
+        elif isinstance(child, ast.UnaryOp):
+            if not isinstance(child.op, ALLOWED_UNARYOPS):
+                raise AnswerExpressionError(
+                    f"operator '{type(child.op).__name__}' is not allowed in '{template}'")
+        elif isinstance(child, ast.Constant):
+            if isinstance(child.value, bool) or not isinstance(child.value, (int, float)):
+                raise AnswerExpressionError(f"only numeric constants are allowed in '{template}'")
+        elif isinstance(child, ast.Name):
+            if child.id not in param_names and child.id not in MATH_NAMES:
+                raise AnswerExpressionError(f"unknown name '{child.id}' in '{template}'")
+        elif isinstance(child, ast.Call):
+            if not isinstance(child.func, ast.Name) or child.func.id not in MATH_NAMES:
+                raise AnswerExpressionError(f"only math functions may be called in '{template}'")
+            if child.keywords:
+                raise AnswerExpressionError(f"keyword arguments are not allowed in '{template}'")
+        elif isinstance(child, (ast.operator, ast.unaryop)):
+            continue
+        else:
+            raise AnswerExpressionError(
+                f"'{type(child).__name__}' is not allowed in '{template}'")
+
+
+@lru_cache(maxsize=None)
+def compile_answer_expression(template):
+    """
+    Parse and validate a correct_answer template such as "{a} * {c} + {b}"
+    and return a cached AnswerExpression. Raises AnswerExpressionError for
+    templates that are not valid arithmetic.
+    """
+    param_names = tuple(dict.fromkeys(PLACEHOLDER_RE.findall(template)))
+    for name in param_names:
+        # {0} or {1x} would be read as a number (or not parse), {if} as a keyword
+        if not name.isidentifier() or keyword.iskeyword(name):
+            raise AnswerExpressionError(f"placeholder {{{name}}} in '{template}' is not a valid parameter name")
+    source = PLACEHOLDER_RE.sub(r"(\1)", template)
+
+    try:
+        tree = ast.parse(source.strip(), mode="eval")
+    except SyntaxError as e:
+        raise AnswerExpressionError(f"invalid expression '{template}': {e.msg}") from None
+
+    _validate(tree, param_names, template)
+    return AnswerExpression(template, param_names, tree)
@@ -0,0 +1,585 @@
+import argparse
+import atexit
+import csv
+import json
+import os
+import sqlite3
+import threading
+import time
+
+import numpy as np
+
+from progress_db import get_db, ProgressDB, PROGRESS_DB
+
+ATTEMPT_FIELDS = [
+    "time_on_question",
+    "difficulty",
+    "topic",
+    "question_type",
+    "submitted_answer",
+    "correct_answer",
+    "correct",
+    "correct_streak",
+    "question_id",
+    "seed"
+]
+
+ATTEMPT_DTYPE = np.dtype([
+    ("time_on_question", "f8"),
+    ("difficulty", "i4"),
+    ("topic", "i4"),
+    ("question_type", "i4"),
+    ("submitted_answer", "f8"),
+    ("correct_answer", "f8"),
+    ("correct", "i1"),
+    ("correct_streak", "i4"),
+    ("question_id", "i4"),
+    ("seed", "i8"),
+])
+# `topic` and `question_id` hold the course's interned ids (see course_compiler.CourseIds);
+# `seed` regenerates the exact instance shown (see qanda.seeded_rng)
+UNKNOWN_ID = -1
+NO_SEED = -1
+# Columns missing from older logs
+_MISSING_DEFAULTS = {"question_id": UNKNOWN_ID, "seed": NO_SEED}
+
+TEXT_ANSWER_COLUMNS = ["reference", "answer", "exact_match", "similarity", "correct", "stage"]
+
+# Per-course files written by earlier versions, before progress moved to the database
+LEGACY_LOG_FILE = "user_data.csv"
+LEGACY_TEXT_ANSWERS_FILE = "text_answers.csv"
+
+# Every attempt is staged in the database before record() returns, whatever
+# the mode: write-behind only defers moving it into the `attempts` and
+# `topic_stats` tables (which other sessions and load_history() read). The
+# mode says how hard staging is synced and when staged attempts are moved:
+#   "row"   - staged with an fsync, moved as soon as each attempt is recorded
+#   "batch" - staged without an fsync (survives the app crashing or being killed, not a power
+#             cut), moved every BATCH_SIZE attempts or FLUSH_INTERVAL seconds
+#   "exit"  - staged like "batch", moved when the store is closed (or by the next session
+#             after a crash)
+DURABILITY = os.environ.get("SKILLSPROUT_LOG_DURABILITY", "batch")
+DURABILITY_MODES = ("row", "batch", "exit")
+BATCH_SIZE = 20
+FLUSH_INTERVAL = 5.0
+RETRY_DELAY = 1.0  # after a failed move, doubled on each further failure
+MAX_RETRY_DELAY = 60.0
+
+
+class TopicStats:
+    """Running aggregates of one topic's attempts."""
+
+    __slots__ = ("attempts", "correct", "similarity_sum", "time_sum", "streak", "max_streak")
+
+    def __init__(self, attempts=0, correct=0, similarity_sum=0.0, time_sum=0.0, streak=0, max_streak=0):
+        self.attempts = attempts
+        self.correct = correct
+        self.similarity_sum = similarity_sum  # sum of submitted_answer (similarity for text questions)
+        self.time_sum = time_sum
+        self.streak = streak  # current run of correct answers within this topic
+        self.max_streak = max_streak  # highest logged correct_streak on this topic's rows
+
+    def add(self, correct, submitted, time_spent, logged_streak):
+        self.attempts += 1
+        self.correct += int(correct)
+        self.similarity_sum += submitted
+        self.time_sum += time_spent
+        self.streak = self.streak + 1 if correct else 0
+        self.max_streak = max(self.max_streak, logged_streak)
+
+    def progress_stats(self):
+        """The stats dict ProgressionManager.is_topic_mastered expects."""
+        return {
+            "n_attempts": self.attempts,
+            "n_correct": self.correct,
+            "avg_similarity": self.similarity_sum / self.attempts if self.attempts else 0.0,
+            "streak": self.max_streak,
+            "current_streak": self.streak,
+            "avg_time": self.time_sum / self.attempts if self.attempts else 0.0,
+        }
+
+    def to_list(self):
+        return [self.attempts, self.correct, self.similarity_sum, self.time_sum, self.streak, self.max_streak]
+
+
+class _Aggregates:
+    """Per-topic stats plus the attempt count and last correct_streak of one learner in one course."""
+
+    __slots__ = ("topics", "n_attempts", "last_streak")
+
+    def __init__(self, topics=None, n_attempts=0, last_streak=0):
+        self.topics = topics or {}
+        self.n_attempts = n_attempts
+        self.last_streak = last_streak
+
+    def add(self, row):
+        self.add_values(int(row["topic"]), int(row["correct"]) == 1, float(row["submitted_answer"]),
+                        float(row["time_on_question"]), int(row["correct_streak"]))
+
+    def add_values(self, topic, correct, submitted, time_spent, streak):
+        self.topics.setdefault(topic, TopicStats()).add(correct, submitted, time_spent, streak)
+        self.n_attempts += 1
+        self.last_streak = streak if correct else 0
+
+    def add_array(self, attempts):
+        """Fold a structured array of ATTEMPT_DTYPE rows in, in order."""
+        columns = zip(attempts["topic"].tolist(), (attempts["correct"] == 1).tolist(),
+                      attempts["submitted_answer"].tolist(), attempts["time_on_question"].tolist(),
+                      attempts["correct_streak"].tolist())
+        for values in columns:
+            self.add_values(*values)
+
+
+class AttemptStore:
+    """
+    One learner's attempt history in one course, kept in the progress
+    database, plus running per-topic aggregates in memory. This is the one
+    place attempts are written.
+
+    record() stages the row in the pending_attempts table, updates memory
+    and queues it; a background thread moves queued rows into the history
+    according to `durability` (see DURABILITY). Each move is one transaction
+    that appends the attempts (and their text answers), updates the
+    topic_stats table and deletes their staged copies, so opening a course
+    reads one row per topic instead of the history, and a crash never
+    leaves stats and attempts out of step. Rows staged by a session that
+    died are recovered when the course is next opened.
+
+    Other sessions of the same learner may write to the same course. The
+    attempt number and correct_streak are therefore assigned when a row is
+    written, and the aggregates are re-read from the database after each
+    write. Use open_store() so every part of the app shares one store per
+    learner and course.
+    """
+
+    def __init__(self, db, learner_id, course, durability=None, batch_size=BATCH_SIZE,
+                 flush_interval=FLUSH_INTERVAL):
+        self.durability = durability or DURABILITY
+        if self.durability not in DURABILITY_MODES:
+            raise ValueError(f"Unknown durability '{self.durability}' (choose from {', '.join(DURABILITY_MODES)})")
+        self.db = db
+        self.learner_id = learner_id
+        self.course = course
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._lock = threading.Lock()  # live aggregates and the pending queue
+        self._record_lock = threading.Lock()  # keeps staged ids in record() order
+        self._flush_lock = threading.Lock()  # serialises writes from this process
+        self._wake = threading.Condition(self._lock)
+        self._pending = []
+        self._pending_since = None
+        self._closing = False
+        self._retry_delay = RETRY_DELAY
+        self._retry_at = 0.0
+        self._failed = None  # the IntegrityError that stopped the writer
+        self._recover()
+        self._live = self._load()
+
+        self._thread = threading.Thread(target=self._run, name="attempt-log", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def _load(self):
+        """The learner's written aggregates in this course, as one consistent read."""
+        key = (self.learner_id, self.course)
+        with self.db.transaction(write=False) as conn:
+            topics = {row[0]: TopicStats(*row[1:]) for row in conn.execute(
+                "SELECT topic, attempts, correct, similarity_sum, time_sum, streak, max_streak "
+                "FROM topic_stats WHERE learner_id = ? AND course = ?", key)}
+            last = _last_attempt(conn, *key)
+        if last is None:
+            return _Aggregates(topics)
+        return _Aggregates(topics, last[0] + 1, last[1])
+
+    def _recover(self):
+        """Move rows staged by sessions of this learner and course that exited without writing them."""
+        key = (self.learner_id, self.course)
+        with self.db.transaction() as conn:
+            staged = conn.execute(
+                "SELECT id, pid, attempt, text_answer, answered_at FROM pending_attempts "
+                "WHERE learner_id = ? AND course = ? ORDER BY id", key).fetchall()
+            orphans = [(pending_id, json.loads(row), None if text is None else json.loads(text), answered_at)
+                       for pending_id, pid, row, text, answered_at in staged if not _process_alive(pid)]
+            if orphans:
+                self._append(conn, orphans)
+        if orphans:
+            print(f"⚠️ Recovered {len(orphans)} attempt(s) that a previous session did not finish writing")
+
+    # --------------------
+    # Writing
+    # --------------------
+    def record(self, time_on_question, difficulty, topic, question_type, submitted_answer, correct_answer, correct,
+               text_answer=None, question_id=UNKNOWN_ID, seed=None):
+        """
+        Stage one attempt (durably, see DURABILITY), queue it and update
+        the in-memory aggregates. `text_answer`
+        (a dict of TEXT_ANSWER_COLUMNS) is stored with the attempt it
+        belongs to; `seed` is the seed the question instance was drawn
+        from (None if it has none). Returns the row; its correct_streak is provisional
+        until the row is written.
+        """
+        with self._record_lock:
+            with self._lock:
+                streak = self._live.last_streak + 1 if correct else 0
+            row = {
+                "time_on_question": float(time_on_question),
+                "difficulty": int(difficulty),
+                "topic": int(topic),
+                "question_type": int(question_type),
+                "submitted_answer": float(submitted_answer),
+                "correct_answer": float(correct_answer),
+                "correct": int(correct),
+                "correct_streak": streak,
+                "question_id": int(question_id),
+                "seed": NO_SEED if seed is None else int(seed),
+            }
+            answered_at = time.time()
+            with self.db.transaction(synchronous="FULL" if self.durability == "row" else "NORMAL") as conn:
+                pending_id = conn.execute(
+                    "INSERT INTO pending_attempts (learner_id, course, pid, answered_at, attempt, text_answer) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (self.learner_id, self.course, os.getpid(), answered_at, json.dumps(row),
+                     None if text_answer is None else json.dumps(text_answer))).lastrowid
+
+            with self._lock:
+                self._live.add(row)
+                if not self._pending:
+                    self._pending_since = time.monotonic()
+                self._pending.append((pending_id, row, text_answer, answered_at))
+                self._wake.notify()
+            return row
+
+    def flush(self):
+        """Write every queued row now."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+            if not entries:
+                return
+            try:
+                self._write(entries)
+            except Exception:
+                # Put the rows back so the next flush (or close) retries them
+                with self._lock:
+                    if not self._pending:
+                        self._pending_since = time.monotonic()
+                    self._pending[:0] = entries
+                raise
+            durable = self._load()
+            with self._lock:
+                # Rows queued meanwhile are not in the history yet
+                for _, row, _, _ in self._pending:
+                    durable.add(row)
+                self._live = durable
+
+    def close(self):
+        """Stop the background writer and write anything still queued."""
+        with self._lock:
+            if self._closing:
+                return
+            self._closing = True
+            self._wake.notify()
+        self._thread.join()
+        if self._failed is None:
+            self.flush()
+        self.db.optimize()
+
+    def _due(self):
+        if not self._pending or self._failed is not None or time.monotonic() < self._retry_at:
+            return False
+        if self.durability == "row":
+            return True
+        if self.durability == "batch":
+            return (len(self._pending) >= self.batch_size
+                    or time.monotonic() - self._pending_since >= self.flush_interval)
+        return False
+
+    def _run(self):
+        with self._lock:
+            while not self._closing:
+                if self._due():
+                    self._lock.release()
+                    try:
+                        self.flush()
+                        self._retry_delay, self._retry_at = RETRY_DELAY, 0.0
+                    except sqlite3.IntegrityError as e:
+                        # Retrying cannot help (usually another session deleted the learner).
+                        # The rows stay staged, so a later session recovers any it still can.
+                        print(f"❌ Stopped writing attempts to {self.db.path}: {e}")
+                        self._failed = e
+                    except Exception as e:
+                        print(f"⚠️ Could not write attempts to {self.db.path} "
+                              f"(retrying in {self._retry_delay:.0f}s): {e}")
+                        self._retry_at = time.monotonic() + self._retry_delay
+                        self._retry_delay = min(self._retry_delay * 2, MAX_RETRY_DELAY)
+                    finally:
+                        self._lock.acquire()
+                    continue
+                timeout = None
+                if self._pending and self._failed is None and self.durability != "exit":
+                    due_at = self._pending_since + self.flush_interval if self.durability == "batch" else 0.0
+                    timeout = max(due_at, self._retry_at) - time.monotonic()
+                    timeout = max(timeout, 0.0)
+                self._wake.wait(timeout)
+
+    def _write(self, entries):
+        """Move queued (pending_id, row, text_answer, answered_at) entries into the history in one transaction."""
+        with self.db.transaction() as conn:
+            self._append(conn, entries)
+
+    def _append(self, conn, entries):
+        last = _last_attempt(conn, self.learner_id, self.course)
+        attempt, streak = (0, 0) if last is None else (last[0] + 1, last[1])
+        for pending_id, row, text_answer, answered_at in entries:
+            streak = streak + 1 if row["correct"] else 0
+            row["correct_streak"] = streak
+            _insert_attempt(conn, self.learner_id, self.course, attempt, row, answered_at)
+            _add_topic_stats(conn, self.learner_id, self.course, row)
+            if text_answer is not None:
+                _insert_text_answer(conn, self.learner_id, self.course, attempt, text_answer)
+            attempt += 1
+        conn.executemany("DELETE FROM pending_attempts WHERE id = ?", [(entry[0],) for entry in entries])
+
+    # --------------------
+    # Queries
+    # --------------------
+    @property
+    def n_attempts(self):
+        with self._lock:
+            return self._live.n_attempts
+
+    def topic_stats(self, topic_index):
+        """Progress stats of one topic (see TopicStats.progress_stats), including queued rows."""
+        with self._lock:
+            return self._live.topics.get(topic_index, TopicStats()).progress_stats()
+
+    def history(self):
+        """Every attempt written so far (after flushing the queue) as a structured array."""
+        self.flush()
+        return load_history(self.db, self.learner_id, self.course)
+
+
+def _process_alive(pid):
+    """Whether a process with this id is running (on this machine, where the database is)."""
+    if pid == os.getpid():
+        return True
+    if os.name == "nt":
+        import ctypes
+        handle = ctypes.windll.kernel32.OpenProcess(0x1000, False, pid)  # PROCESS_QUERY_LIMITED_INFORMATION
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        ctypes.windll.kernel32.CloseHandle(handle)
+        return exit_code.value == 259  # STILL_ACTIVE
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _last_attempt(conn, learner_id, course):
+    return conn.execute(
+        "SELECT attempt, correct_streak FROM attempts WHERE learner_id = ? AND course = ? "
+        "ORDER BY attempt DESC LIMIT 1", (learner_id, course)).fetchone()
+
+
+def _insert_attempt(conn, learner_id, course, attempt, row, answered_at=None):
+    conn.execute(
+        f"INSERT INTO attempts (learner_id, course, attempt, {', '.join(ATTEMPT_FIELDS)}, answered_at) "
+        f"VALUES (?, ?, ?, {', '.join('?' * len(ATTEMPT_FIELDS))}, ?)",
+        (learner_id, course, attempt, *(row[name] for name in ATTEMPT_FIELDS), answered_at))
+
+
+def _insert_text_answer(conn, learner_id, course, attempt, text_answer):
+    conn.execute(
+        f"INSERT INTO text_answers (learner_id, course, attempt, {', '.join(TEXT_ANSWER_COLUMNS)}) "
+        f"VALUES (?, ?, ?, {', '.join('?' * len(TEXT_ANSWER_COLUMNS))})",
+        (learner_id, course, attempt, *(text_answer.get(name) for name in TEXT_ANSWER_COLUMNS)))
+
+
+def _add_topic_stats(conn, learner_id, course, row):
+    correct = int(row["correct"])
+    conn.execute(
+        "INSERT INTO topic_stats (learner_id, course, topic, attempts, correct, similarity_sum, time_sum, "
+        "streak, max_streak) VALUES (?, ?, ?, 1, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (learner_id, course, topic) DO UPDATE SET "
+        "attempts = attempts + 1, correct = correct + excluded.correct, "
+        "similarity_sum = similarity_sum + excluded.similarity_sum, time_sum = time_sum + excluded.time_sum, "
+        "streak = CASE WHEN excluded.correct THEN streak + 1 ELSE 0 END, "
+        "max_streak = MAX(max_streak, excluded.max_streak)",
+        (learner_id, course, row["topic"], correct, row["submitted_answer"], row["time_on_question"],
+         correct, row["correct_streak"]))
+
+
+def _save_aggregates(conn, learner_id, course, aggregates):
+    """Replace a learner's topic_stats rows in a course."""
+    conn.execute("DELETE FROM topic_stats WHERE learner_id = ? AND course = ?", (learner_id, course))
+    conn.executemany(
+        "INSERT INTO topic_stats (learner_id, course, topic, attempts, correct, similarity_sum, time_sum, "
+        "streak, max_streak) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [(learner_id, course, topic, *stats.to_list()) for topic, stats in aggregates.topics.items()])
+
+
+def load_history(db, learner_id, course, topic=None, question_id=None, conn=None):
+    """
+    A learner's attempts in a course, in order, as a structured array of
+    ATTEMPT_DTYPE: all of them, or only one topic's or one question's
+    (both filters are index lookups). Pass `conn` to read inside an open
+    transaction.
+    """
+    query = f"SELECT {', '.join(ATTEMPT_FIELDS)} FROM attempts WHERE learner_id = ? AND course = ?"
+    params = [learner_id, course]
+    if topic is not None:
+        query += " AND topic = ?"
+        params.append(topic)
+    if question_id is not None:
+        query += " AND question_id = ?"
+        params.append(question_id)
+    rows = (conn or db.connection()).execute(query + " ORDER BY attempt", params).fetchall()
+    return np.array(rows, dtype=ATTEMPT_DTYPE)
+
+
+def write_history(db, learner_id, course, attempts, conn=None):
+    """
+    Rewrite a learner's attempts in a course in place (same length and
+    order as load_history returned) and rebuild their topic stats. Pass
+    the `conn` of the write transaction the history was loaded in, or
+    attempts written in between would be left out of the stats.
+    """
+    if conn is None:
+        with db.transaction() as conn:
+            return write_history(db, learner_id, course, attempts, conn)
+    aggregates = _Aggregates()
+    aggregates.add_array(attempts)
+    assignments = ", ".join(f"{name} = ?" for name in ATTEMPT_FIELDS)
+    conn.executemany(
+        f"UPDATE attempts SET {assignments} WHERE learner_id = ? AND course = ? AND attempt = ?",
+        [(*values, learner_id, course, attempt) for attempt, values in enumerate(attempts.tolist())])
+    _save_aggregates(conn, learner_id, course, aggregates)
+
+
+def load_text_answers(db, course, learner_id=None):
+    """[dict] of a course's stored text answers (one learner's, or everyone's)."""
+    query = (f"SELECT learner_id, attempt, {', '.join(TEXT_ANSWER_COLUMNS)} FROM text_answers "
+             "WHERE course = ?")
+    params = [course]
+    if learner_id is not None:
+        query += " AND learner_id = ?"
+        params.append(learner_id)
+    cursor = db.connection().execute(query + " ORDER BY learner_id, attempt", params)
+    names = [d[0] for d in cursor.description]
+    return [dict(zip(names, row)) for row in cursor]
+
+
+def update_text_answers(db, course, answers):
+    """Write back the similarity, correct and stage of text answers from load_text_answers."""
+    with db.transaction() as conn:
+        conn.executemany(
+            "UPDATE text_answers SET similarity = ?, correct = ?, stage = ? "
+            "WHERE learner_id = ? AND course = ? AND attempt = ?",
+            [(a["similarity"], a["correct"], a["stage"], a["learner_id"], course, a["attempt"]) for a in answers])
+
+
+# --------------------
+# Importing per-course logs from earlier versions
+# --------------------
+def _parse_field(value, kind, default=0):
+    try:
+        return float(value) if kind == "f" else int(float(value))
+    except (TypeError, ValueError):
+        return default
+
+
+def read_log(path):
+    """
+    A CSV attempt log as a structured array of ATTEMPT_DTYPE (unparseable
+    values become 0; columns older logs lack get their _MISSING_DEFAULTS).
+    """
+    kinds = [(name, ATTEMPT_DTYPE[name].kind, _MISSING_DEFAULTS.get(name, 0)) for name in ATTEMPT_FIELDS]
+    try:
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            rows = [tuple(_parse_field(row.get(name), kind, default) for name, kind, default in kinds)
+                    for row in csv.DictReader(f)]
+    except FileNotFoundError:
+        rows = []
+    return np.array(rows, dtype=ATTEMPT_DTYPE)
+
+
+def import_legacy_course(db, learner_id, course_dir):
+    """
+    Give a learner the attempts, text answers and completed topics that
+    an earlier version kept in the course folder. The folder is left as
+    it is. Returns the number of attempts imported.
+    """
+    course = os.path.basename(os.path.normpath(course_dir))
+    attempts = read_log(os.path.join(course_dir, LEGACY_LOG_FILE))
+
+    text_answers = []
+    try:
+        with open(os.path.join(course_dir, LEGACY_TEXT_ANSWERS_FILE), "r", newline="", encoding="utf-8") as f:
+            text_answers = [row for row in csv.DictReader(f)
+                            if _parse_field(row.get("attempt"), "i") < len(attempts)]
+    except FileNotFoundError:
+        pass
+
+    completed = []
+    try:
+        with open(os.path.join(course_dir, "progressiontree.json"), "r", encoding="utf-8") as f:
+            completed = [t["name"] for t in json.load(f).get("topics", []) if t.get("completed")]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    aggregates = _Aggregates()
+    aggregates.add_array(attempts)
+    with db.transaction() as conn:
+        if _last_attempt(conn, learner_id, course) is not None:
+            raise ValueError(f"Learner {learner_id} already has attempts in '{course}'")
+        for attempt, values in enumerate(attempts.tolist()):
+            _insert_attempt(conn, learner_id, course, attempt, dict(zip(ATTEMPT_FIELDS, values)))
+        for row in text_answers:
+            text_answer = dict(row, exact_match=_parse_field(row.get("exact_match"), "i"),
+                               correct=_parse_field(row.get("correct"), "i"),
+                               similarity=_parse_field(row.get("similarity"), "f"))
+            _insert_text_answer(conn, learner_id, course, _parse_field(row["attempt"], "i"), text_answer)
+        _save_aggregates(conn, learner_id, course, aggregates)
+        conn.executemany(
+            "INSERT OR IGNORE INTO completed_topics (learner_id, course, topic, completed_at) VALUES (?, ?, ?, ?)",
+            [(learner_id, course, topic, time.time()) for topic in completed])
+    return len(attempts)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def open_store(learner_id, course, db=None):
+    """The process-wide AttemptStore of a learner in a course, opened on first use."""
+    db = db or get_db()
+    key = (os.path.abspath(db.path), learner_id, course)
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = AttemptStore(db, learner_id, course)
+        return store
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Import a course folder's old user_data.csv, text_answers.csv and completed flags "
+                    "into a learner's profile")
+    parser.add_argument("course_dir")
+    parser.add_argument("--learner", required=True, help="Learner name (created if missing)")
+    parser.add_argument("--db", default=PROGRESS_DB)
+    args = parser.parse_args()
+
+    progress_db = ProgressDB(args.db)
+    learner = progress_db.learner_id(args.learner)
+    if learner is None:
+        learner = progress_db.add_learner(args.learner)
+    n = import_legacy_course(progress_db, learner, args.course_dir)
+    print(f"✅ Imported {n} attempts from {args.course_dir} for {args.learner}")
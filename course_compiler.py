@@ -0,0 +1,285 @@
+import argparse
+import hashlib
+import json
+import os
+import string
+import sys
+import tempfile
+
+import numpy as np
+
+from nlp_utils import GRADING_OPTIONS
+from qanda import get_question_bank, course_questions_path
+
+COMPILED_FILE = ".compiled.json"
+COMPILER_VERSION = 6
+DEFAULT_SAMPLES = 5000
+
+
+def _tree_fingerprint(progression_path):
+    """Hash of the tree structure, ignoring the `completed` flags that change at runtime."""
+    with open(progression_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    structure = [
+        {k: v for k, v in topic.items() if k != "completed"}
+        for topic in data.get("topics", [])
+    ]
+    return hashlib.sha256(json.dumps(structure, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def _file_fingerprint(path):
+    st = os.stat(path)
+    return f"{st.st_size}:{st.st_mtime_ns}"
+
+
+def check_prerequisites(topics):
+    """Return errors for dangling prerequisite names and prerequisite cycles."""
+    errors = []
+    names = {t["name"] for t in topics}
+    graph = {t["name"]: [p for p in t.get("prerequisites", []) if p in names] for t in topics}
+
+    for t in topics:
+        for p in t.get("prerequisites", []):
+            if p not in names:
+                errors.append(f"[{t['name']}] prerequisite '{p}' is not a topic in progressiontree.json")
+
+    # Iterative DFS colouring: 0 unvisited, 1 on stack, 2 done
+    state = {name: 0 for name in graph}
+    for start in graph:
+        if state[start]:
+            continue
+        stack = [(start, iter(graph[start]))]
+        path = [start]
+        state[start] = 1
+        while stack:
+            node, children = stack[-1]
+            child = next(children, None)
+            if child is None:
+                state[node] = 2
+                stack.pop()
+                path.pop()
+            elif state[child] == 1:
+                cycle = path[path.index(child):] + [child]
+                errors.append(f"prerequisite cycle: {' -> '.join(cycle)}")
+            elif state[child] == 0:
+                state[child] = 1
+                stack.append((child, iter(graph[child])))
+                path.append(child)
+    return errors
+
+
+def check_question(topic, question, samples, rng):
+    """Return (errors, warnings) for one question template."""
+    errors, warnings = [], []
+    label = f"[{topic}] '{question.question_text}'"
+
+    # Every {field} in the question text must be a parameter
+    try:
+        fields = {f for _, f, _, _ in string.Formatter().parse(question.question_text) if f is not None}
+    except ValueError as e:
+        errors.append(f"{label}: malformed question text: {e}")
+        fields = set()
+    for field in sorted(fields):
+        name = field.split(".")[0].split("[")[0]
+        if name not in question.params:
+            errors.append(f"{label}: question text uses {{{field}}} but it is not in params")
+
+    if not isinstance(question.grading, dict):
+        errors.append(f"{label}: grading must be an object")
+    else:
+        for option, value in question.grading.items():
+            if option not in GRADING_OPTIONS:
+                errors.append(f"{label}: unknown grading option '{option}' "
+                              f"(choose from {', '.join(GRADING_OPTIONS)})")
+            elif value is None and option != "threshold":
+                continue  # a null band disables that lexical stage
+            elif isinstance(value, bool) or not isinstance(value, (int, float)):
+                errors.append(f"{label}: grading option '{option}' must be a number")
+
+    if isinstance(question.correct_answer, list):
+        if question.question_type != 2:
+            errors.append(f"{label}: a list of correct answers is only supported for text questions")
+        elif not question.correct_answer or not all(isinstance(a, str) and a.strip()
+                                                    for a in question.correct_answer):
+            errors.append(f"{label}: correct_answer list must hold non-empty strings")
+        return errors, warnings
+
+    if question.answer_error:
+        errors.append(f"{label}: {question.answer_error}")
+        return errors, warnings
+
+    if question.answer_expr is None:
+        return errors, warnings
+
+    # Sample the answer over many parameter draws to find invalid results
+    n = samples if question.randomize else 1
+    try:
+        answers = question.answer_expr.evaluate_array(question.sample_params(n, rng))
+    except Exception as e:
+        errors.append(f"{label}: correct_answer '{question.correct_answer}' raised "
+                      f"{type(e).__name__}: {e} for sampled parameters")
+        return errors, warnings
+    bad = int(np.count_nonzero(~np.isfinite(answers)))
+    if bad:
+        message = (f"{label}: correct_answer '{question.correct_answer}' is undefined "
+                   f"(division by zero, NaN or overflow) for {bad}/{n} sampled parameter sets")
+        # Always invalid is an error; occasionally invalid is a warning
+        (errors if bad == n else warnings).append(message)
+    return errors, warnings
+
+
+def compile_course(course_dir, samples=DEFAULT_SAMPLES, force=False, seed=0):
+    """
+    Validate a course ahead of time and cache the result in
+    <course_dir>/.compiled.json. The cached result is reused until
+    progressiontree.json's structure or the question bank changes.
+
+    Returns a dict with "errors" and "warnings" lists and course counts.
+    """
+    progression_path = os.path.join(course_dir, "progressiontree.json")
+    questions_path = course_questions_path(course_dir)
+    compiled_path = os.path.join(course_dir, COMPILED_FILE)
+
+    key = {
+        "version": COMPILER_VERSION,
+        "tree": _tree_fingerprint(progression_path),
+        "questions": _file_fingerprint(questions_path),
+        "samples": samples,
+    }
+
+    if not force and os.path.exists(compiled_path):
+        try:
+            with open(compiled_path, "r", encoding="utf-8") as f:
+                cached = json.load(f)
+            if cached.get("key") == key:
+                return cached
+        except (OSError, ValueError):
+            pass
+
+    with open(progression_path, "r", encoding="utf-8") as f:
+        topics = json.load(f).get("topics", [])
+
+    errors = check_prerequisites(topics)
+    warnings = []
+
+    bank = get_question_bank(questions_path)
+    topic_names = {t["name"] for t in topics}
+    rng = np.random.default_rng(seed)
+    n_questions = 0
+    n_text_questions = 0
+    for topic in bank.topics():
+        if topic not in topic_names:
+            warnings.append(f"[{topic}] has questions but is not in progressiontree.json")
+    for topic, question in bank.iter_questions():
+        n_questions += 1
+        n_text_questions += question.question_type == 2
+        q_errors, q_warnings = check_question(topic, question, samples, rng)
+        errors.extend(q_errors)
+        warnings.extend(q_warnings)
+
+    result = {
+        "key": key,
+        "n_topics": len(topics),
+        "n_questions": n_questions,
+        "n_text_questions": n_text_questions,
+        "errors": errors,
+        "warnings": warnings,
+    }
+
+    # Write atomically so a concurrent reader never sees half a file (and two app
+    # instances compiling the same course never share a temporary file)
+    fd, tmp_path = tempfile.mkstemp(dir=course_dir, prefix=COMPILED_FILE, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        os.replace(tmp_path, compiled_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return result
+
+
+class CourseIds:
+    """
+    The interned ids of a course's topics and questions. These are what
+    the attempt log stores in its `topic` and `question_id` columns; a
+    topic or question keeps its id when others are added, removed or
+    reordered. Only looks ids up (course_ids() interns them): topics are
+    read once, questions one indexed lookup at a time.
+    """
+
+    def __init__(self, db, course):
+        self.db = db
+        self.course = course
+        self._topic_ids = None
+
+    def topic_id(self, topic_name):
+        """The id of a topic, or -1 (with a warning) for a name the course does not define."""
+        if self._topic_ids is None:
+            self._topic_ids = self.db.interned_ids(self.course, "topic")
+        topic_id = self._topic_ids.get(topic_name)
+        if topic_id is None:
+            print(f"⚠️ Topic '{topic_name}' has no id; was the course opened in the app?")
+            return -1
+        return topic_id
+
+    def question_id(self, question):
+        """The id of a Question (or QuestionInstance), or -1 if it was never interned."""
+        key = getattr(question, "key", None)
+        question_id = None if key is None else self.db.interned_id(self.course, "question", key)
+        return -1 if question_id is None else question_id
+
+    def question_key(self, question_id):
+        """The Question.key behind a logged question id, or None."""
+        return self.db.interned_key(self.course, "question", question_id)
+
+
+def course_fingerprint(course_dir):
+    """Changes whenever the course's topic structure or question bank file does."""
+    questions_path = course_questions_path(course_dir)
+    try:
+        questions = _file_fingerprint(questions_path)
+    except OSError:
+        questions = "missing"
+    return f"{_tree_fingerprint(os.path.join(course_dir, 'progressiontree.json'))}/{questions}"
+
+
+def course_ids(course_dir, db):
+    """
+    Intern a course's topic and question keys in the progress database
+    (only when its files changed since they were last interned) and
+    return its CourseIds. Keys are read straight from the course files,
+    so ids never depend on the course validating.
+    """
+    course = os.path.basename(os.path.normpath(course_dir))
+    fingerprint = course_fingerprint(course_dir)
+    if db.interned_fingerprint(course) != fingerprint:
+        with open(os.path.join(course_dir, "progressiontree.json"), "r", encoding="utf-8") as f:
+            db.intern(course, "topic", [t["name"] for t in json.load(f).get("topics", [])])
+        try:
+            db.intern(course, "question", get_question_bank(course_questions_path(course_dir)).iter_keys())
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Could not read the questions of {course_dir}: {e}")
+        else:
+            db.set_interned_fingerprint(course, fingerprint)
+    return CourseIds(db, course)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Validate a course and cache the result")
+    parser.add_argument("course_dir")
+    parser.add_argument("--samples", type=int, default=DEFAULT_SAMPLES,
+                        help="Parameter draws per randomized question")
+    parser.add_argument("--force", action="store_true", help="Ignore the cached result")
+    args = parser.parse_args()
+
+    result = compile_course(args.course_dir, samples=args.samples, force=args.force)
+    for message in result["errors"]:
+        print(f"❌ {message}")
+    for message in result["warnings"]:
+        print(f"⚠️ {message}")
+    print(f"{result['n_questions']} questions in {result['n_topics']} topics: "
+          f"{len(result['errors'])} errors, {len(result['warnings'])} warnings")
+    sys.exit(1 if result["errors"] else 0)
@@ -1,12 +1,13 @@
 import os
 import json
-import csv
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QPushButton, QListWidget, QTextEdit,
     QFileDialog, QLabel, QLineEdit, QMessageBox, QFormLayout, QGroupBox,
     QComboBox, QCheckBox, QSpinBox, QInputDialog
 )
 from PyQt5.QtCore import Qt, pyqtSignal
+from question_store import import_course, export_course
+from nlp_utils import ReferenceEmbeddingCache, as_references
 
 
 class DesignCourseScreen(QWidget):
@@ -14,7 +15,7 @@ class DesignCourseScreen(QWidget):
     Screen for creating or editing a course consisting of:
     - progressiontree.json (topics)
     - questions.json (questions grouped by topic)
-    - user_data.csv (tracks user interactions)
+    Learner progress is kept in the progress database, not in the course.
     """
     return_to_main_menu = pyqtSignal()  # 🔹 Signal to switch back to MainMenu
 
@@ -128,7 +129,7 @@ class DesignCourseScreen(QWidget):
     # 3️⃣ COURSE CREATION / LOADING
     # ======================================================
     def create_new_course(self):
-        """Create a new empty course folder and user_data.csv."""
+        """Create a new empty course folder."""
         folder = QFileDialog.getExistingDirectory(self, "Select Folder to Create Course In")
         if not folder:
             return
@@ -151,15 +152,6 @@ class DesignCourseScreen(QWidget):
         with open(os.path.join(course_folder, "questions.json"), "w") as f:
             json.dump(self.questions_data, f, indent=2)
 
-        # Create user_data.csv with headers
-        user_data_file = os.path.join(course_folder, "user_data.csv")
-        with open(user_data_file, "w", newline="") as f:
-            writer = csv.writer(f)
-            writer.writerow([
-                "time_on_question", "difficulty", "topic", "question_type",
-                "submitted_answer", "correct_answer", "correct", "correct_streak"
-            ])
-
         self.course_path = course_folder
         self.init_course_editor()
 
@@ -170,6 +162,12 @@ class DesignCourseScreen(QWidget):
 
         qfile = os.path.join(folder, "questions.json")
         pfile = os.path.join(folder, "progressiontree.json")
+        dbfile = os.path.join(folder, "questions.db")
+
+        # Courses served from SQLite are edited through their JSON export
+        if os.path.exists(dbfile) and (
+                not os.path.exists(qfile) or os.path.getmtime(dbfile) > os.path.getmtime(qfile)):
+            export_course(folder)
 
         if not os.path.exists(qfile) or not os.path.exists(pfile):
             QMessageBox.warning(self, "Missing Files", "This folder must contain questions.json and progressiontree.json")
@@ -290,6 +288,8 @@ class DesignCourseScreen(QWidget):
         self.q_is_integer = QCheckBox()
         self.q_params = QTextEdit()
         self.q_correct = QLineEdit()
+        self.q_alternatives = QTextEdit()
+        self.q_alternatives.setPlaceholderText("Other accepted answers, one per line")
         self.q_image = QLineEdit()
         self.q_type = QComboBox()
         self.q_type.addItems(["0 - Numeric", "1 - Multiple Choice", "2 - Text"])
@@ -301,6 +301,7 @@ class DesignCourseScreen(QWidget):
         form.addRow("Is Integer:", self.q_is_integer)
         form.addRow("Params (JSON):", self.q_params)
         form.addRow("Correct Answer:", self.q_correct)
+        form.addRow("Also Accept (text):", self.q_alternatives)
         form.addRow("Image Path:", self.q_image)
         form.addRow("Question Type:", self.q_type)
         form.addRow("Exact Match:", self.q_exact)
@@ -318,7 +319,9 @@ class DesignCourseScreen(QWidget):
         self.q_randomize.setChecked(q["randomize"])
         self.q_is_integer.setChecked(q["is_integer"])
         self.q_params.setPlainText(json.dumps(q["params"], indent=2))
-        self.q_correct.setText(q["correct_answer"])
+        answers = q["correct_answer"] if isinstance(q["correct_answer"], list) else [q["correct_answer"]]
+        self.q_correct.setText(str(answers[0]) if answers and answers[0] is not None else "")
+        self.q_alternatives.setPlainText("\n".join(str(a) for a in answers[1:]))
         self.q_image.setText(q["image"] or "")
         self.q_type.setCurrentIndex(q["question_type"])
         self.q_exact.setChecked(q["exact_match"])
@@ -339,12 +342,18 @@ class DesignCourseScreen(QWidget):
             QMessageBox.warning(self, "Invalid JSON", "Params field must contain valid JSON.")
             return
 
+        # Text questions can accept several answers; the first is shown as the model answer
+        correct_answer = self.q_correct.text()
+        alternatives = [line.strip() for line in self.q_alternatives.toPlainText().splitlines() if line.strip()]
+        if self.q_type.currentIndex() == 2 and alternatives:
+            correct_answer = [correct_answer] + alternatives
+
         q.update({
             "question": self.q_text.toPlainText(),
             "difficulty": self.q_difficulty.value(),
             "randomize": self.q_randomize.isChecked(),
             "is_integer": self.q_is_integer.isChecked(),
-            "correct_answer": self.q_correct.text(),
+            "correct_answer": correct_answer,
             "image": self.q_image.text() or None,
             "question_type": self.q_type.currentIndex(),
             "exact_match": self.q_exact.isChecked()
@@ -362,6 +371,17 @@ class DesignCourseScreen(QWidget):
             json.dump(self.progression_data, f, indent=2)
         with open(os.path.join(self.course_path, "questions.json"), "w") as f:
             json.dump(self.questions_data, f, indent=2)
+        if os.path.exists(os.path.join(self.course_path, "questions.db")):
+            import_course(self.course_path)
+
+        # Drop cached embeddings of text answers that were edited or removed
+        ReferenceEmbeddingCache(self.course_path).prune(
+            answer
+            for qlist in self.questions_data.values()
+            for q in qlist
+            if q.get("question_type") == 2
+            for answer in as_references(q.get("correct_answer"))
+        )
         QMessageBox.information(self, "Saved", "Course saved successfully.")
 
     # ======================================================
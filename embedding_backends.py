@@ -0,0 +1,182 @@
+import argparse
+import os
+import sys
+
+import numpy as np
+
+MODEL_NAME = 'all-MiniLM-L6-v2'
+HF_MODEL_ID = 'sentence-transformers/all-MiniLM-L6-v2'
+MAX_SEQ_LENGTH = 256
+
+DEFAULT_ONNX_DIR = os.path.join(os.path.expanduser("~"), ".cache", "skillsprout", "onnx", f"{MODEL_NAME}-int8")
+
+
+class SentenceTransformerBackend:
+    """The original PyTorch sentence-transformers model (fp32)."""
+
+    name = "torch"
+
+    def __init__(self):
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(MODEL_NAME)
+
+    def encode(self, texts, batch_size=64):
+        """Unit-length embeddings of a list of strings as an (n, dim) float32 array."""
+        return self.model.encode(list(texts), batch_size=batch_size,
+                                 normalize_embeddings=True, convert_to_numpy=True)
+
+
+class OnnxInt8Backend:
+    """
+    all-MiniLM-L6-v2 exported to ONNX with int8 dynamically quantized
+    weights, run through onnxruntime on CPU. Does not import torch, so the
+    process stays hundreds of MB smaller than the PyTorch backend.
+
+    The model directory is produced once by export_onnx_int8().
+    """
+
+    name = "onnx-int8"
+
+    def __init__(self, model_dir=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        model_dir = model_dir or os.environ.get("SKILLSPROUT_ONNX_DIR", DEFAULT_ONNX_DIR)
+        model_path = os.path.join(model_dir, "model_int8.onnx")
+        if not os.path.exists(model_path):
+            raise FileNotFoundError(
+                f"{model_path} not found; run `python embedding_backends.py export` first")
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        self.tokenizer.enable_truncation(max_length=MAX_SEQ_LENGTH)
+        self.tokenizer.enable_padding()
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def encode(self, texts, batch_size=64):
+        """Unit-length embeddings of a list of strings as an (n, dim) float32 array."""
+        texts = list(texts)
+        out = []
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            token_embeddings = self.session.run(None, feeds)[0]
+
+            # Mean pooling over real tokens, then L2 normalisation (as sentence-transformers does)
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out.append(pooled.astype(np.float32))
+        if not out:
+            return np.zeros((0, 384), dtype=np.float32)
+        return np.vstack(out)
+
+
+BACKENDS = {
+    SentenceTransformerBackend.name: SentenceTransformerBackend,
+    OnnxInt8Backend.name: OnnxInt8Backend,
+}
+
+
+def create_backend(name):
+    try:
+        return BACKENDS[name]()
+    except KeyError:
+        raise ValueError(f"Unknown embedding backend '{name}' (choose from {', '.join(BACKENDS)})") from None
+
+
+def export_onnx_int8(model_dir=DEFAULT_ONNX_DIR):
+    """
+    One-off export of the transformer to ONNX followed by int8 dynamic
+    quantization. Needs torch, transformers and onnxruntime; the resulting
+    directory only needs onnxruntime and tokenizers to run.
+    """
+    import torch
+    from transformers import AutoModel, AutoTokenizer
+    from onnxruntime.quantization import quantize_dynamic, QuantType
+
+    os.makedirs(model_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(HF_MODEL_ID)
+    model = AutoModel.from_pretrained(HF_MODEL_ID).eval()
+
+    sample = tokenizer(["an example sentence"], return_tensors="pt")
+    fp32_path = os.path.join(model_dir, "model_fp32.onnx")
+    torch.onnx.export(
+        model,
+        (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+        fp32_path,
+        input_names=["input_ids", "attention_mask", "token_type_ids"],
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"}
+                      for name in ("input_ids", "attention_mask", "token_type_ids", "last_hidden_state")},
+        opset_version=14,
+    )
+    quantize_dynamic(fp32_path, os.path.join(model_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.backend_tokenizer.save(os.path.join(model_dir, "tokenizer.json"))
+    print(f"✅ Exported int8 ONNX model to {model_dir}")
+
+
+# (answer, reference) pairs around the grading threshold, used by check_parity
+PARITY_PAIRS = [
+    ("A function with a constant rate of change", "A function with a constant rate of change"),
+    ("a function whose rate of change is constant", "A function with a constant rate of change"),
+    ("a straight line graph", "A function with a constant rate of change"),
+    ("it forms a parabola", "A function with a constant rate of change"),
+    ("the slope of the tangent line", "The instantaneous rate of change of a function"),
+    ("how fast the function changes at a point", "The instantaneous rate of change of a function"),
+    ("the area under the curve", "The instantaneous rate of change of a function"),
+    ("the area under a curve", "The area under the curve between two limits"),
+    ("adding up infinitely many thin rectangles", "The area under the curve between two limits"),
+    ("I don't know", "The area under the curve between two limits"),
+    ("opposite over hypotenuse", "The ratio of the opposite side to the hypotenuse"),
+    ("adjacent over hypotenuse", "The ratio of the opposite side to the hypotenuse"),
+]
+
+
+def check_parity(candidate="onnx-int8", reference="torch", pairs=PARITY_PAIRS, threshold=None, tolerance=0.05):
+    """
+    Compare a backend's similarity scores with the reference backend.
+    Returns True if no score differs by more than `tolerance` and no
+    answer changes side of the grading threshold.
+    """
+    from nlp_utils import SIMILARITY_THRESHOLD
+    threshold = SIMILARITY_THRESHOLD if threshold is None else threshold
+
+    answers = [a for a, _ in pairs]
+    refs = [r for _, r in pairs]
+    scores = {}
+    for name in (reference, candidate):
+        backend = create_backend(name)
+        scores[name] = np.einsum("ij,ij->i", backend.encode(answers), backend.encode(refs))
+
+    diff = np.abs(scores[candidate] - scores[reference])
+    flips = (scores[candidate] >= threshold) != (scores[reference] >= threshold)
+    for (answer, ref), a, b, flip in zip(pairs, scores[reference], scores[candidate], flips):
+        print(f"{'❌' if flip else '  '} {a:.3f} {b:.3f}  {answer!r} vs {ref!r}")
+    print(f"max |Δ| = {diff.max():.4f}, decisions flipped at {threshold}: {int(flips.sum())}/{len(pairs)}")
+    return bool(diff.max() <= tolerance and not flips.any())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Manage text-similarity embedding backends")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="Export the int8 ONNX model")
+    export_parser.add_argument("--model-dir", default=DEFAULT_ONNX_DIR)
+    parity_parser = sub.add_parser("parity", help="Compare a backend's scores with the PyTorch model")
+    parity_parser.add_argument("--backend", default="onnx-int8")
+    parity_parser.add_argument("--tolerance", type=float, default=0.05)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        export_onnx_int8(args.model_dir)
+    else:
+        sys.exit(0 if check_parity(args.backend, tolerance=args.tolerance) else 1)
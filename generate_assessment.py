@@ -0,0 +1,157 @@
+import argparse
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from qanda import get_question_bank, course_questions_path
+
+# Redraws allowed per slot before accepting a duplicate variant
+MAX_REDRAWS = 20
+
+# Set once per worker process by _init_worker
+_bank = None
+
+
+def load_quotas(path):
+    """
+    Read {topic: {difficulty: count}} quotas, e.g.
+    {"Functions": {"2": 3, "3": 2}, "Differentiation": {"6": 2}}
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        raw = json.load(f)
+    return [(topic, int(difficulty), int(count))
+            for topic, per_difficulty in raw.items()
+            for difficulty, count in per_difficulty.items()]
+
+
+def variant_key(topic, instance):
+    """Hash identifying a question template together with its sampled params."""
+    payload = json.dumps([topic, instance.template.question_text, sorted(instance.params.items())])
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def _init_worker(questions_path):
+    global _bank
+    _bank = get_question_bank(questions_path)
+
+
+def _draw(topic, difficulty, rng, seen):
+    """Draw one instance whose variant is not in `seen` (if that is possible)."""
+    for _ in range(MAX_REDRAWS):
+        template = _bank.pick(topic, difficulty, rng=rng)
+        if template is None:
+            return None, None
+        instance = template.instantiate(rng)
+        key = variant_key(topic, instance)
+        # Fixed questions have a single variant, so never redraw them
+        if key not in seen or not template.randomize:
+            return instance, key
+    return instance, key
+
+
+def generate_exam(student, seed_seq, quotas):
+    """Generate one student's exam from its own seeded RNG stream."""
+    rng = np.random.default_rng(seed_seq)
+    seen = set()
+    questions = []
+    for topic, difficulty, count in quotas:
+        for _ in range(count):
+            instance, key = _draw(topic, difficulty, rng, seen)
+            if instance is None:
+                break
+            seen.add(key)
+            questions.append({
+                "topic": topic,
+                "difficulty": instance.difficulty,
+                "question": instance.text,
+                "answer": instance.answer,
+                "params": instance.params,
+                "choices": instance.choices,
+                "image": instance.image,
+                "variant": key,
+            })
+    return {"student": student, "questions": questions}
+
+
+def _generate_chunk(students, seed_seqs, quotas):
+    return [generate_exam(s, seq, quotas) for s, seq in zip(students, seed_seqs)]
+
+
+def generate_assessment(course_dir, n_students, quotas, seed=None, workers=None, chunk_size=25):
+    """
+    Generate exams for n_students across a process pool. Each student gets
+    an independent RNG stream spawned from `seed`, so a run is reproducible
+    regardless of how students are split between processes.
+    """
+    questions_path = course_questions_path(course_dir)
+    root = np.random.SeedSequence(seed)
+    seed_seqs = root.spawn(n_students)
+
+    exams = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(questions_path,)) as pool:
+        futures = [
+            pool.submit(_generate_chunk,
+                        list(range(start, min(start + chunk_size, n_students))),
+                        seed_seqs[start:start + chunk_size],
+                        quotas)
+            for start in range(0, n_students, chunk_size)
+        ]
+        for future in futures:
+            exams.extend(future.result())
+
+    n_regenerated = dedupe_exams(exams, root, quotas, questions_path)
+    return {"seed": root.entropy, "n_regenerated": n_regenerated, "exams": exams}
+
+
+def exam_fingerprint(exam):
+    return frozenset(q["variant"] for q in exam["questions"])
+
+
+def dedupe_exams(exams, root, quotas, questions_path, max_attempts=MAX_REDRAWS):
+    """
+    Replace exams that are identical (same set of variants) to an earlier
+    one. Each exam is already free of repeated variants; this catches
+    collisions between students generated in different processes. The
+    replacements draw from fresh streams spawned from the same root seed.
+    """
+    _init_worker(questions_path)
+    seen = set()
+    n_regenerated = 0
+    for i, exam in enumerate(exams):
+        fingerprint = exam_fingerprint(exam)
+        attempts = 0
+        while fingerprint in seen and attempts < max_attempts:
+            exam = generate_exam(exam["student"], root.spawn(1)[0], quotas)
+            fingerprint = exam_fingerprint(exam)
+            attempts += 1
+        if attempts:
+            exams[i] = exam
+            n_regenerated += 1
+        seen.add(fingerprint)
+    return n_regenerated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate randomized exams/worksheets for a course")
+    parser.add_argument("course_dir", help="Course folder containing questions.json (or questions.db)")
+    parser.add_argument("-n", "--students", type=int, required=True, help="Number of exams to generate")
+    parser.add_argument("-q", "--quotas", help="Quota JSON {topic: {difficulty: count}} "
+                                               "(default: <course_dir>/assessment_quotas.json)")
+    parser.add_argument("-o", "--output", default="exams.json", help="Output JSON file")
+    parser.add_argument("--seed", type=int, default=None, help="Master seed for reproducible runs")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    quotas_path = args.quotas or os.path.join(args.course_dir, "assessment_quotas.json")
+    result = generate_assessment(args.course_dir, args.students, load_quotas(quotas_path),
+                                 seed=args.seed, workers=args.workers)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+
+    print(f"✅ Wrote {len(result['exams'])} exams to {args.output} "
+          f"(seed {result['seed']}, {result['n_regenerated']} duplicate exams regenerated)")
@@ -0,0 +1,109 @@
+from nlp_utils import as_references, grade_text_answer, normalize_answer, STAGE_EXACT
+
+
+def format_references(correct_answer):
+    """The stored reference of a text answer: accepted answers one per line."""
+    return "\n".join(as_references(correct_answer))
+
+
+def parse_references(text):
+    """Inverse of format_references: a string, or a list for several answers."""
+    references = str(text).split("\n")
+    return references if len(references) > 1 else references[0]
+
+
+class GradeResult:
+    """
+    The outcome of grading one submission. It is computed once and then
+    shared by feedback, the attempt log, Q-learning and progression.
+    """
+
+    __slots__ = ("user_answer", "correct_answer", "question_type", "exact_match",
+                 "correct", "similarity", "time_spent", "stage")
+
+    def __init__(self, user_answer, correct_answer, question_type, exact_match,
+                 correct, similarity, time_spent, stage=None):
+        self.user_answer = user_answer
+        self.correct_answer = correct_answer
+        self.question_type = question_type
+        self.exact_match = exact_match
+        self.correct = correct
+        self.similarity = similarity  # None for numeric / multiple-choice questions
+        self.time_spent = time_spent
+        self.stage = stage  # grading cascade step that decided a text answer
+
+    def feedback(self):
+        """Feedback text shown under the question."""
+        if self.correct:
+            text = "✅ Correct!"
+        else:
+            correct_answer = self.correct_answer
+            if isinstance(correct_answer, (list, tuple)) and correct_answer:
+                correct_answer = correct_answer[0]  # the first accepted answer is the model answer
+            text = f"❌ Incorrect. Correct answer: {correct_answer}"
+        if self.question_type == 2 and not self.exact_match:
+            text += f" (Similarity: {self.similarity:.2f})"
+        return text
+
+    def logged_values(self):
+        """(submitted_answer, correct_answer) as numbers for the attempt log columns."""
+        if self.question_type == 2:
+            return float(self.similarity), (1.0 if self.correct else 0.0)
+        try:
+            submitted = float(self.user_answer)
+        except Exception:
+            submitted = 0.0
+        try:
+            correct = float(self.correct_answer)
+        except Exception:
+            correct = 0.0
+        return submitted, correct
+
+    def text_answer(self):
+        """The raw submission of a text question, stored with its attempt so it can be re-graded."""
+        return {
+            "reference": format_references(self.correct_answer),
+            "answer": self.user_answer,
+            "exact_match": int(bool(self.exact_match)),
+            "similarity": self.similarity,
+            "correct": int(self.correct),
+            "stage": self.stage,
+        }
+
+
+def grade_submission(question_instance, user_answer, time_spent=0.0, reference_cache=None):
+    """Grade one answer to a QuestionInstance and return a GradeResult."""
+    qtype = getattr(question_instance, "question_type", 0)
+    exact_match = getattr(question_instance, "exact_match", False)
+    correct_val = getattr(question_instance, "evaluated_answer", None)
+    correct = False
+    similarity = None
+    stage = None
+
+    if qtype == 1:  # multiple choice
+        correct = user_answer is not None and user_answer == correct_val
+
+    elif qtype == 2:  # text-based question
+        try:
+            if exact_match:
+                correct = normalize_answer(user_answer) in {normalize_answer(r) for r in as_references(correct_val)}
+                similarity = 1.0 if correct else 0.0
+                stage = STAGE_EXACT
+            else:
+                options = getattr(question_instance, "grading", None) or {}
+                similarity, correct, stage = grade_text_answer(
+                    user_answer, correct_val, reference_cache=reference_cache, **options)
+        except Exception as e:
+            print(f"⚠️ Text similarity check failed: {e}")
+            similarity = 0.0
+            correct = False
+            stage = None
+
+    else:  # numeric input
+        try:
+            correct = float(user_answer) == float(correct_val)
+        except Exception:
+            correct = str(user_answer).strip().lower() == str(correct_val).strip().lower()
+
+    return GradeResult(user_answer, correct_val, qtype, exact_match,
+                       bool(correct), similarity, float(time_spent), stage)
@@ -0,0 +1,328 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import stat
+import struct
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+
+def _default_socket_dir():
+    # A directory only this user can enter, never a fixed name in a world-writable /tmp
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "skillsprout")
+    uid = os.getuid() if hasattr(os, "getuid") else os.getpid()
+    return os.path.join(tempfile.gettempdir(), f"skillsprout-{uid}")
+
+
+# Unix socket of the shared grading service; an empty value turns the client off
+GRADING_SOCKET = os.environ.get("SKILLSPROUT_GRADING_SOCKET", os.path.join(_default_socket_dir(), "grading.sock"))
+# Account a client accepts a service from besides its own (for a --group service run by another user)
+GRADING_OWNER = os.environ.get("SKILLSPROUT_GRADING_OWNER", "")
+
+MAX_MESSAGE_BYTES = 16 * 1024 * 1024
+CONNECT_TIMEOUT = 0.5
+REQUEST_TIMEOUT = 30.0
+RETRY_INTERVAL = 10.0  # seconds before a client tries an unreachable service again
+
+
+class ReferenceLRU:
+    """In-memory LRU of reference-answer embeddings shared by all clients of the service."""
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self._rows = OrderedDict()
+
+    def encode(self, texts):
+        """(len(texts), dim) embeddings, encoding only the references not seen recently."""
+        from nlp_utils import encode_batch
+
+        missing = [t for t in dict.fromkeys(texts) if t not in self._rows]
+        if missing:
+            for text, embedding in zip(missing, encode_batch(missing)):
+                self._rows[text] = embedding
+        for text in texts:
+            self._rows.move_to_end(text)
+        matrix = np.array([self._rows[t] for t in texts], dtype=np.float32)
+        while len(self._rows) > self.max_size:
+            self._rows.popitem(last=False)
+        return matrix
+
+
+class GradingService:
+    """
+    Holds one embedding model and scores (answer, references) pairs sent by
+    every SkillSprout process on the host over a Unix domain socket.
+
+    Requests that arrive while the model is busy, or within `max_wait`
+    seconds of each other, are merged into one batch of up to `max_batch`
+    answers, so concurrent clients share a single forward pass.
+    """
+
+    def __init__(self, socket_path=GRADING_SOCKET, max_batch=256, max_wait=0.005, group=None):
+        self.socket_path = socket_path
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.group = group  # members of this group may connect; otherwise only this user
+        self.references = ReferenceLRU()
+        self._queue = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    async def serve(self):
+        from nlp_utils import get_embedding_model, embedding_id
+
+        get_embedding_model()
+        self.model = embedding_id()
+        self._queue = asyncio.Queue()
+        _secure_socket_dir(os.path.dirname(self.socket_path), self.group)
+        _remove_stale_socket(self.socket_path)
+        server = await asyncio.start_unix_server(self._handle, path=self.socket_path, limit=MAX_MESSAGE_BYTES)
+        os.chmod(self.socket_path, 0o660 if self.group else 0o600)
+        batcher = asyncio.ensure_future(self._batch_loop())
+        print(f"✅ Grading service ({self.model}) listening on {self.socket_path}")
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            batcher.cancel()
+            if os.path.exists(self.socket_path):
+                os.remove(self.socket_path)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    response = await self._dispatch(json.loads(line))
+                except Exception as e:
+                    response = {"error": str(e)}
+                writer.write(json.dumps(response).encode("utf-8") + b"\n")
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"model": self.model}
+        if op == "similarity":
+            # Scores from another model/backend would not match the client's thresholds
+            if request.get("model") != self.model:
+                return {"error": f"service runs {self.model}, client expects {request.get('model')}"}
+            future = asyncio.get_running_loop().create_future()
+            await self._queue.put((request["pairs"], future))
+            return {"similarities": await future}
+        return {"error": f"unknown op {op!r}"}
+
+    async def _batch_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self._queue.get()]
+            n = len(items[0][0])
+            deadline = loop.time() + self.max_wait
+            while n < self.max_batch:
+                try:
+                    item = await asyncio.wait_for(self._queue.get(), max(deadline - loop.time(), 0))
+                except asyncio.TimeoutError:
+                    break
+                items.append(item)
+                n += len(item[0])
+
+            answers = [answer for pairs, _ in items for answer, _ in pairs]
+            references = [refs for pairs, _ in items for _, refs in pairs]
+            try:
+                similarities = await loop.run_in_executor(self._executor, self._score, answers, references)
+            except Exception as e:
+                for _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            offset = 0
+            for pairs, future in items:
+                if not future.done():
+                    future.set_result(similarities[offset:offset + len(pairs)].tolist())
+                offset += len(pairs)
+
+    def _score(self, answers, references):
+        from nlp_utils import get_text_similarities
+        return get_text_similarities(answers, references, batch_size=self.max_batch,
+                                     encode_references=self.references.encode)
+
+
+def _secure_socket_dir(directory, group=None):
+    """
+    Create (or check) the socket's directory: owned by this user and closed
+    to everyone else, or only open to `group` (read/enter, never write).
+    An existing directory is never loosened or tightened, only refused if
+    someone else owns it or could write to it, since they could swap the
+    socket.
+    """
+    try:
+        os.mkdir(directory, 0o700)
+    except FileExistsError:
+        pass
+    else:
+        if group:
+            import grp
+            os.chown(directory, -1, grp.getgrnam(group).gr_gid)
+            os.chmod(directory, 0o750)
+    info = os.lstat(directory)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+        raise RuntimeError(f"{directory} is not a directory owned by this user")
+    if info.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise RuntimeError(f"{directory} is writable by other users")
+
+
+def _trusted_uids():
+    uids = {os.getuid()}
+    if GRADING_OWNER:
+        import pwd
+        uids.add(pwd.getpwnam(GRADING_OWNER).pw_uid)
+    return uids
+
+
+def _peer_uid(sock, socket_path):
+    """The uid of the process listening on a connected Unix socket."""
+    if hasattr(socket, "SO_PEERCRED"):
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, struct.calcsize("3i"))
+        return struct.unpack("3i", creds)[1]
+    # No peer credentials on this platform: trust the socket file's owner
+    return os.lstat(socket_path).st_uid
+
+
+def _remove_stale_socket(path):
+    """Remove a socket file left by a service that is no longer running."""
+    if not os.path.exists(path):
+        return
+    probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        probe.connect(path)
+    except OSError:
+        os.remove(path)
+    else:
+        raise RuntimeError(f"a grading service is already listening on {path}")
+    finally:
+        probe.close()
+
+
+class GradingServiceClient:
+    """
+    Blocking client for GradingService, safe to share between threads.
+    Every method returns None when the service is unreachable or refuses
+    the request, so callers can fall back to grading in-process.
+    """
+
+    def __init__(self, socket_path=GRADING_SOCKET):
+        self.socket_path = socket_path
+        self._sock = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._retry_at = 0.0
+
+    def ping(self):
+        """The model the service runs, or None."""
+        response = self._request({"op": "ping"})
+        return None if response is None else response.get("model")
+
+    def similarities(self, pairs):
+        """Best similarity of each (answer, [references]) pair, or None."""
+        from nlp_utils import embedding_id
+        response = self._request({"op": "similarity", "model": embedding_id(),
+                                  "pairs": [[a, list(refs)] for a, refs in pairs]})
+        return None if response is None else response["similarities"]
+
+    def similarity(self, user_answer, references):
+        result = self.similarities([(user_answer, references)])
+        return None if result is None else float(result[0])
+
+    def _request(self, message):
+        with self._lock:
+            if time.monotonic() < self._retry_at or not os.path.exists(self.socket_path):
+                return None
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._file.write(json.dumps(message).encode("utf-8") + b"\n")
+                self._file.flush()
+                line = self._file.readline(MAX_MESSAGE_BYTES)
+                if not line:
+                    raise ConnectionError("grading service closed the connection")
+                response = json.loads(line)
+                if "error" in response:
+                    raise RuntimeError(response["error"])
+                return response
+            except (OSError, ValueError, RuntimeError) as e:
+                print(f"⚠️ Grading service unavailable, grading in-process: {e}")
+                self._close()
+                self._retry_at = time.monotonic() + RETRY_INTERVAL
+                return None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.settimeout(CONNECT_TIMEOUT)
+            sock.connect(self.socket_path)
+            # Answers are only sent to a service run by this user (or GRADING_OWNER)
+            uid = _peer_uid(sock, self.socket_path)
+            if uid not in _trusted_uids():
+                raise ConnectionError(f"grading socket {self.socket_path} is served by untrusted uid {uid}")
+            sock.settimeout(REQUEST_TIMEOUT)
+        except OSError:
+            sock.close()
+            raise
+        self._sock = sock
+        self._file = sock.makefile("rwb")
+
+    def _close(self):
+        if self._sock is not None:
+            try:
+                self._file.close()
+                self._sock.close()
+            except OSError:
+                pass
+        self._sock = self._file = None
+
+
+_client = None
+
+
+def get_client():
+    """The process-wide client, or None if the service is disabled or unsupported here."""
+    global _client
+    if not GRADING_SOCKET or not hasattr(socket, "AF_UNIX"):
+        return None
+    if _client is None:
+        _client = GradingServiceClient(GRADING_SOCKET)
+    return _client
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Share one text-similarity model between SkillSprout processes")
+    parser.add_argument("--socket", default=GRADING_SOCKET or None, required=not GRADING_SOCKET)
+    parser.add_argument("--max-batch", type=int, default=256, help="Most answers scored in one batch")
+    parser.add_argument("--max-wait-ms", type=float, default=5.0,
+                        help="How long to wait for more requests to join a batch")
+    parser.add_argument("--group", help="Let members of this group connect (they set SKILLSPROUT_GRADING_SOCKET "
+                                        "to --socket and SKILLSPROUT_GRADING_OWNER to this user)")
+    args = parser.parse_args()
+
+    service = GradingService(args.socket, max_batch=args.max_batch,
+                             max_wait=args.max_wait_ms / 1000.0, group=args.group)
+    try:
+        asyncio.run(service.serve())
+    except KeyboardInterrupt:
+        print("Grading service stopped.")
@@ -0,0 +1,79 @@
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, pyqtSignal
+
+
+class _JobSignals(QObject):
+    done = pyqtSignal(int, object, object)  # ticket, result, exception
+
+
+class _Job(QRunnable):
+    def __init__(self, ticket, fn, args, signals):
+        super().__init__()
+        self.ticket = ticket
+        self.fn = fn
+        self.args = args
+        self.signals = signals
+
+    def run(self):
+        try:
+            result, error = self.fn(*self.args), None
+        except Exception as e:
+            result, error = None, e
+        self.signals.done.emit(self.ticket, result, error)
+
+
+class GradingPipeline(QObject):
+    """
+    Runs grading and attempt logging off the GUI thread.
+
+    Jobs run one at a time on a single pool thread, in the order they were
+    submitted, so log rows and streaks are written in answer order. Their
+    callbacks are called back on the GUI thread, also strictly in
+    submission order.
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._pool = QThreadPool(self)
+        self._pool.setMaxThreadCount(1)
+        self._signals = _JobSignals()
+        self._signals.done.connect(self._on_done)
+        self._next_ticket = 0
+        self._next_delivery = 0
+        self._callbacks = {}
+        self._finished = {}
+
+    def submit(self, fn, *args, on_done=None, on_error=None):
+        """Run fn(*args) on the worker thread; returns the job's ticket."""
+        ticket = self._next_ticket
+        self._next_ticket += 1
+        self._callbacks[ticket] = (on_done, on_error)
+        self._pool.start(_Job(ticket, fn, args, self._signals))
+        return ticket
+
+    def busy(self):
+        """True while any submitted job has not been delivered yet."""
+        return self._next_delivery < self._next_ticket
+
+    def discard_callbacks(self):
+        """Keep running queued jobs but drop their callbacks (e.g. their screen was closed)."""
+        for ticket in self._callbacks:
+            self._callbacks[ticket] = (None, None)
+
+    def wait(self, msecs=-1):
+        """Block until every queued job has run."""
+        return self._pool.waitForDone(msecs)
+
+    def _on_done(self, ticket, result, error):
+        self._finished[ticket] = (result, error)
+        # Deliver in submission order, holding back results that arrive early
+        while self._next_delivery in self._finished:
+            result, error = self._finished.pop(self._next_delivery)
+            on_done, on_error = self._callbacks.pop(self._next_delivery)
+            self._next_delivery += 1
+            if error is not None:
+                if on_error is not None:
+                    on_error(error)
+                else:
+                    print(f"⚠️ Background grading job failed: {error}")
+            elif on_done is not None:
+                on_done(result)
@@ -5,10 +5,12 @@ import shutil
 import csv
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QFrame,
-    QLabel, QPushButton, QStackedWidget, QListWidget, QFileDialog, QMessageBox, QGroupBox, QGraphicsDropShadowEffect
+    QLabel, QPushButton, QStackedWidget, QListWidget, QFileDialog, QMessageBox, QGroupBox, QGraphicsDropShadowEffect,
+    QInputDialog
 )
 from PyQt5.QtGui import QFont, QPalette, QColor, QPixmap, QPainter, QPen, QIcon
 from PyQt5.QtCore import Qt, QTimer, QSize
+from collections import namedtuple
 from learningtree import load_learning_tree, TopicNode
 from PyQt5.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QPushButton, QLabel, QStackedWidget, QListWidget, QLineEdit, QRadioButton, QButtonGroup
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -16,17 +18,25 @@ import matplotlib.pyplot as plt
 import networkx as nx
 import json
 from adaptivedifficulty import *
-from qanda import load_questions_from_file, get_randomized_question
+from qanda import load_questions_from_file, get_randomized_question, course_questions_path, get_question_bank, text_reference_answers
 from learningtree import TopicNode, load_learning_tree 
 from data import *
-import copy
-from nlp_utils import get_text_similarity, SIMILARITY_THRESHOLD
+from nlp_utils import get_text_similarity, SIMILARITY_THRESHOLD, warm_up_async, ReferenceEmbeddingCache
 from progression_manager import ProgressionManager
 from design_course_screen import DesignCourseScreen
+from question_prefetch import QuestionPrefetcher
+from grading import grade_submission
+from grading_worker import GradingPipeline
+from attempt_store import open_store
+from progress_db import get_db
+from course_compiler import compile_course, course_ids, CourseIds
 
 
 COURSES_DIR = "courses"
 
+# What the grading thread hands back to QuestionScreen for one submission
+SubmissionResult = namedtuple("SubmissionResult", ["grade", "mastered", "newly_mastered"])
+
 def load_course_tree(course_name):
     file_path = os.path.join("courses", course_name, "progressiontree.json")
     return load_learning_tree(file_path)
@@ -75,11 +85,18 @@ class MainMenu(QWidget):
         layout.addWidget(title_label)
 
 
+        # --- Current learner ---
+        self.learner_label = QLabel("No learner selected", self)
+        self.learner_label.setFont(QFont("Times New Roman", 16))
+        self.learner_label.setAlignment(Qt.AlignCenter)
+        layout.addWidget(self.learner_label)
+
         # --- Buttons ---
+        self.select_learner_btn = QPushButton("Select Learner", self)
         self.select_course_btn = QPushButton("Select Course", self)
         self.design_course_btn = QPushButton("Design Course", self)
 
-        for btn in [self.select_course_btn, self.design_course_btn]:
+        for btn in [self.select_learner_btn, self.select_course_btn, self.design_course_btn]:
             btn.setFixedSize(320, 70)
             btn.setFont(QFont("Times New Roman", 18, QFont.Bold))
             btn.setStyleSheet("""
@@ -109,6 +126,132 @@ class MainMenu(QWidget):
         self.setPalette(palette)
 
 
+class LearnerSelectionScreen(QWidget):
+    def __init__(self, parent, app_window):
+        super().__init__(parent)
+        self.app_window = app_window
+
+        # --- Layout ---
+        self.layout = QVBoxLayout(self)
+        self.layout.setSpacing(30)
+        self.layout.setContentsMargins(40, 40, 40, 40)
+
+        # --- Title ---
+        self.title_label = OutlinedLabel("Who is learning?")
+        self.title_label.setFont(QFont("Times New Roman", 36, QFont.Bold))
+        self.title_label.setAlignment(Qt.AlignCenter)
+        self.layout.addWidget(self.title_label)
+
+        # --- Learner List ---
+        self.learner_list_widget = QListWidget(self)
+        self.learner_list_widget.setStyleSheet("""
+            QListWidget {
+                background-color: #E0F2F1;
+                border: 3px solid black;
+                border-radius: 10px;
+                padding: 10px;
+                font-size: 18px;
+            }
+            QListWidget::item:selected {
+                background-color: #81C784;
+                color: white;
+            }
+        """)
+        self.layout.addWidget(self.learner_list_widget)
+
+        # --- Buttons ---
+        button_layout = QHBoxLayout()
+        button_layout.setSpacing(20)
+
+        self.add_button = QPushButton("Add Learner")
+        self.delete_button = QPushButton("Delete Learner")
+        self.select_button = QPushButton("Select Learner")
+
+        for btn in [self.add_button, self.delete_button, self.select_button]:
+            btn.setFixedSize(200, 60)
+            btn.setFont(QFont("Times New Roman", 16, QFont.Bold))
+            btn.setStyleSheet("""
+                QPushButton {
+                    background-color: #66BB6A;
+                    color: white;
+                    border: 3px solid black;
+                    border-radius: 15px;
+                }
+                QPushButton:hover {
+                    background-color: #81C784;
+                }
+                QPushButton:pressed {
+                    background-color: #388E3C;
+                }
+            """)
+            button_layout.addWidget(btn)
+
+        self.layout.addLayout(button_layout)
+
+        # --- Background ---
+        palette = self.palette()
+        palette.setColor(QPalette.Window, QColor(204, 255, 229))  # soft mint
+        self.setAutoFillBackground(True)
+        self.setPalette(palette)
+
+        # --- Connect button signals ---
+        self.add_button.clicked.connect(self.add_learner)
+        self.delete_button.clicked.connect(self.delete_learner)
+        self.select_button.clicked.connect(self.select_learner)
+        self.learner_list_widget.itemDoubleClicked.connect(lambda _: self.select_learner())
+
+        # --- Load learners ---
+        self.refresh_learner_list()
+
+    def refresh_learner_list(self):
+        """Reload the learner profiles from the progress database."""
+        self.learner_list_widget.clear()
+        self.learners = self.app_window.progress_db.learners()
+        self.learner_list_widget.addItems([name for _, name in self.learners])
+
+    def selected_learner(self):
+        row = self.learner_list_widget.currentRow()
+        if row < 0:
+            QMessageBox.warning(self, "Error", "No learner selected!")
+            return None
+        return self.learners[row]
+
+    def add_learner(self):
+        name, ok = QInputDialog.getText(self, "Add Learner", "Learner name:")
+        if not ok:
+            return
+        try:
+            self.app_window.progress_db.add_learner(name)
+        except ValueError as e:
+            QMessageBox.warning(self, "Error", str(e))
+            return
+        self.refresh_learner_list()
+
+    def delete_learner(self):
+        learner = self.selected_learner()
+        if learner is None:
+            return
+        learner_id, name = learner
+        if learner_id == self.app_window.learner_id:
+            QMessageBox.warning(self, "Error", f"'{name}' is the current learner. Select someone else first.")
+            return
+        reply = QMessageBox.question(
+            self, "Delete Learner", f"Delete '{name}' and all of their progress?",
+            QMessageBox.Yes | QMessageBox.No
+        )
+        if reply == QMessageBox.Yes:
+            self.app_window.progress_db.delete_learner(learner_id)
+            delete_checkpoints(learner_id)
+            self.refresh_learner_list()
+
+    def select_learner(self):
+        learner = self.selected_learner()
+        if learner is None:
+            return
+        self.app_window.set_learner(*learner)
+        self.app_window.stack.setCurrentWidget(self.app_window.course_selection_screen)
+
+
 class CourseSelectionScreen(QWidget):
     def __init__(self, parent, app_window):
         super().__init__(parent)
@@ -305,6 +448,11 @@ class ProgressionTreeScreen(QWidget):
         node_colors = []
         node_names = []
 
+        # Completion is per learner, not the flag in progressiontree.json
+        manager = self.app_window.progression_manager
+        for topic in self.topics:
+            topic.completed = manager.is_completed(topic.name)
+
         # Build graph
         for topic in self.topics:
             G.add_node(topic.name)
@@ -451,29 +599,17 @@ class ProgressionTreeScreen(QWidget):
         topic_label.setStyleSheet("background-color: transparent; border: none;")
         layout.addWidget(topic_label)
 
-        # --- Load stats from CSV ---
+        # --- Stats from the course's running aggregates (no log scan) ---
         stats_text = "No data available for this topic."
-        user_data_file = os.path.join(COURSES_DIR, self.course_name, "user_data.csv")
-        if os.path.exists(user_data_file):
-            import pandas as pd
-            df = pd.read_csv(user_data_file)
-            if 'topic' in df.columns:
-                # Map TopicNode to its numeric index in the CSV
-                topic_index = self.topics.index(topic)
-                topic_df = df[df['topic'] == topic_index]
-
-                if not topic_df.empty:
-                    total_questions = len(topic_df)
-                    avg_time = topic_df['time_on_question'].mean()
-                    correct_count = topic_df['correct'].sum()
-                    accuracy = (correct_count / total_questions) * 100
-                    max_streak = topic_df['correct_streak'].max()
-                    stats_text = (
-                        f"Questions attempted: {total_questions}\n"
-                        f"Average time: {avg_time:.1f}s\n"
-                        f"Accuracy: {accuracy:.1f}%\n"
-                        f"Max correct streak: {max_streak}"
-                    )
+        stats = self.app_window.attempt_store.topic_stats(self.app_window.course_ids.topic_id(topic.name))
+        if stats["n_attempts"]:
+            accuracy = (stats["n_correct"] / stats["n_attempts"]) * 100
+            stats_text = (
+                f"Questions attempted: {stats['n_attempts']}\n"
+                f"Average time: {stats['avg_time']:.1f}s\n"
+                f"Accuracy: {accuracy:.1f}%\n"
+                f"Max correct streak: {stats['streak']}"
+            )
 
         stats_label = QLabel(stats_text, self.popup)
         stats_label.setAlignment(Qt.AlignCenter)
@@ -632,16 +768,29 @@ class QuestionScreen(QWidget):
 
         # --- Timer and Q-learning placeholders ---
         self.timer = QTimer(self)
+        self.timer.timeout.connect(self.increment_time)
         self.time_spent = 0
         self.q_learning_agent = getattr(app_window, "q_learning_agent", None)
+        self.attempt_store = app_window.attempt_store
+        self.course_ids = app_window.course_ids
+        self.topic_id = self.course_ids.topic_id(self.selected_topic)
 
         # --- Connect buttons ---
         self.submit_button.clicked.connect(self.on_submit_answer)
         self.next_button.clicked.connect(self.on_next_question)
         self.back_button.clicked.connect(self.on_back_to_topics)
 
+        # --- Prefetch upcoming questions in the background ---
+        self.prefetcher = QuestionPrefetcher(
+            self.selected_topic,
+            course_questions_path(os.path.join("courses", self.course_name)),
+            os.path.join("courses", self.course_name, "images")
+        )
+        self.next_difficulty = None
+
         # --- Load first question ---
         self.load_random_question()
+        self.refresh_topic_progression()
 
     # ------------------- IMAGE -------------------
     def display_image(self, image_path):
@@ -660,32 +809,28 @@ class QuestionScreen(QWidget):
         else:
             self.image_label.setVisible(False)
 
-    def check_topic_mastery_and_notify(self):
+    def display_prepared_image(self, image):
+        """Show an image that was already decoded and scaled by the prefetcher."""
+        if image is None or image.isNull():
+            self.image_label.setVisible(False)
+            return
+        self.image_label.setPixmap(QPixmap.fromImage(image))
+        self.image_label.setStyleSheet("""
+            border: 2px solid black;
+            border-radius: 10px;
+            margin: 0px;
+            padding: 0px;
+        """)
+        self.image_label.setVisible(True)
+
+    def topic_stats(self):
+        """Attempt statistics for this topic from the learner's running aggregates."""
+        return self.attempt_store.topic_stats(self.topic_id)
+
+    def check_topic_mastery_and_notify(self, mastered):
         """
-        Check if the current topic is mastered and display a brief popup if so.
+        Display a brief popup the first time the current topic is found mastered.
         """
-
-        # Load topic progression JSON
-        progression_file = os.path.join("courses", self.course_name, "progressiontree.json")
-        manager = ProgressionManager(progression_file)
-
-        # Compute stats for this topic from CSV
-        import pandas as pd
-        user_data_file = os.path.join("courses", self.course_name, "user_data.csv")
-        stats = {"n_attempts": 0, "n_correct": 0, "avg_similarity": 0.0, "streak": 0}
-        if os.path.exists(user_data_file):
-            df = pd.read_csv(user_data_file)
-            topic_index = [t["name"] for t in manager.topics.values()].index(self.selected_topic)
-            topic_df = df[df["topic"] == topic_index]
-            if not topic_df.empty:
-                stats["n_attempts"] = len(topic_df)
-                stats["n_correct"] = topic_df["correct"].sum()
-                stats["streak"] = topic_df["correct_streak"].max()
-                if 'submitted_answer' in topic_df.columns and 'correct_answer' in topic_df.columns:
-                    stats["avg_similarity"] = topic_df["submitted_answer"].mean()  # approximate
-
-        # Check mastery
-        mastered = manager.is_topic_mastered(self.selected_topic, stats)
         if mastered and not getattr(self, "_topic_mastered_flag", False):
             self._topic_mastered_flag = True  # prevent repeated popups
 
@@ -729,47 +874,42 @@ class QuestionScreen(QWidget):
         self.question_label.setText("")  # clear feedback
 
         # --- Build path ---
-        questions_path = os.path.join("courses", self.course_name, "questions.json")
+        questions_path = course_questions_path(os.path.join("courses", self.course_name))
         if not os.path.exists(questions_path):
-            self.question_text.setText(f"❌ Error: questions.json not found at {questions_path}")
+            self.question_text.setText(f"❌ Error: question bank not found at {questions_path}")
             self.image_label.setVisible(False)
             return
 
-        # --- Q-learning chooses difficulty ---
+        # --- Q-learning chooses difficulty once per answer (in on_answer_graded); only the
+        # first question of a screen is chosen here. take() keeps that difficulty prefetched.
         try:
-            difficulty = self.q_learning_agent.choose_action()
-            question_text, numeric_answer, question_instance = get_randomized_question(
-                self.selected_topic,
-                difficulty=difficulty,
-                questions_path=questions_path
-            )
+            if self.next_difficulty is None:
+                self.next_difficulty = difficulty_for_action(self.q_learning_agent.choose_action())
+            prepared = self.prefetcher.take(self.next_difficulty)
         except Exception as e:
             self.question_text.setText(f"⚠️ Error loading question: {e}")
             self.image_label.setVisible(False)
             return
 
+        question_text, question_instance = prepared.text, prepared.instance
         if question_instance is None:
             self.question_text.setText("No questions available for this topic.")
             self.image_label.setVisible(False)
             return
 
-        self.question_instance = copy.deepcopy(question_instance)
+        self.question_instance = question_instance
         self.correct_answer = getattr(self.question_instance, "correct_answer", None)
-        self.difficulty = getattr(self.question_instance, "difficulty", "medium")
+        self.difficulty = getattr(self.question_instance, "difficulty", prepared.difficulty)
 
         # --- Display image ---
-        img_filename = getattr(self.question_instance, "image", None)
-        if img_filename:
-            img_path = os.path.join("courses", self.course_name, "images", img_filename)
-            self.display_image(img_path)
-        else:
-            self.image_label.setVisible(False)
+        self.display_prepared_image(prepared.image)
 
         # --- Display question text ---
         self.question_text.setText(question_text)
 
         # --- Reset input / multiple choice ---
         self.answer_input.clear()
+        self.answer_input.setReadOnly(False)
         self.answer_input.show()
         self.submit_button.setEnabled(True)
         self.next_button.setEnabled(False)
@@ -800,88 +940,79 @@ class QuestionScreen(QWidget):
         # --- Start timer ---
         self.timer.start(1000)
 
-        # --- NEW: Check progression for this topic ---
-        try:
-            import pandas as pd
-            csv_path = os.path.join("courses", self.course_name, "user_data.csv")
-            if os.path.exists(csv_path):
-                df = pd.read_csv(csv_path)
-                topic_index = next((i for i, t in enumerate(self.app_window.progression_manager.topics)
-                                    if t == self.selected_topic), 0)
-                topic_df = df[df["topic"] == topic_index]
-
-                stats = {
-                    "n_attempts": len(topic_df),
-                    "n_correct": topic_df["correct"].sum(),
-                    "avg_similarity": topic_df["submitted_answer"].mean() if not topic_df.empty else 0.0,
-                    "streak": topic_df["correct_streak"].max() if not topic_df.empty else 0
-                }
-
-                newly_mastered, newly_unlocked = self.app_window.progression_manager.check_and_update_progress(
-                    {self.selected_topic: stats}
-                )
-
-                # Refresh tree so unlocked topics appear
-                self.app_window.progression_screen.draw_tree()
+    def refresh_topic_progression(self):
+        """Check progression for this topic when the screen opens (on the grading thread)."""
+        self.app_window.grading_pipeline.submit(
+            self.update_topic_progression, self.app_window.progression_manager,
+            on_done=self.on_progression_updated,
+            on_error=lambda e: print(f"⚠️ Progression check failed: {e}")
+        )
 
-        except Exception as e:
-            print(f"⚠️ Progression check failed: {e}")
+    def update_topic_progression(self, manager):
+        """Recompute this topic's stats and record a completion. Runs on the grading thread."""
+        newly_mastered, newly_unlocked = manager.check_and_update_progress(
+            {self.selected_topic: self.topic_stats()}
+        )
+        return newly_mastered
 
+    def on_progression_updated(self, newly_mastered):
+        # Only redraw the tree when a topic actually changed state
+        if newly_mastered:
+            self.app_window.progression_screen.draw_tree()
 
 
     def increment_time(self):
         self.time_spent += 1
 
     def on_submit_answer(self):
-        """Handle answer submission."""
+        """Handle answer submission: grading and logging run on the grading thread."""
         self.timer.stop()
 
         qtype = getattr(self.question_instance, "question_type", 0)
-        exact_match = getattr(self.question_instance, "exact_match", False)
-        correct = False
         user_answer = None
-
-        # --- Determine correctness ---
         if qtype == 1:  # multiple choice
             selected_btn = self.choices_group.checkedButton()
             if selected_btn:
                 user_answer = selected_btn.text()
-                correct = user_answer == self.question_instance.evaluated_answer
-
         else:  # numeric or text
             user_answer = self.answer_input.text().strip()
-            correct_val = getattr(self.question_instance, "evaluated_answer", None)
 
-            if qtype == 2:  # text-based question
-                try:
-                    from nlp_utils import check_text_answer, get_text_similarity
-                    if exact_match:
-                        correct = str(user_answer).strip().lower() == str(correct_val).strip().lower()
-                        similarity = 1.0 if correct else get_text_similarity(user_answer, correct_val)
-                    else:
-                        similarity = get_text_similarity(user_answer, correct_val)
-                        correct = similarity >= 0.8  # adjustable global threshold
-                except Exception as e:
-                    print(f"⚠️ Text similarity check failed: {e}")
-                    similarity = 0.0
-                    correct = False
-
-            else:  # numeric input
-                try:
-                    user_val = float(user_answer)
-                    correct = float(user_val) == float(correct_val)
-                except Exception:
-                    correct = str(user_answer).strip().lower() == str(correct_val).strip().lower()
+        # --- Pending state until the result comes back ---
+        self.submit_button.setEnabled(False)
+        self.next_button.setEnabled(False)
+        self.answer_input.setReadOnly(True)
+        if self.choices_group is not None:
+            for btn in self.choices_group.buttons():
+                btn.setEnabled(False)
+        self.question_label.setText("⏳ Checking your answer...")
+
+        self.app_window.grading_pipeline.submit(
+            self.grade_and_record, self.question_instance, user_answer, self.time_spent,
+            self.difficulty, self.app_window.progression_manager,
+            on_done=self.on_answer_graded, on_error=self.on_grading_failed
+        )
 
-        # --- Feedback ---
-        if qtype == 2:
-            feedback = "✅ Correct!" if correct else f"❌ Incorrect. Correct answer: {correct_val}"
-            if not exact_match:
-                feedback += f" (Similarity: {similarity:.2f})"
-        else:
-            feedback = "✅ Correct!" if correct else f"❌ Incorrect. Correct answer: {self.question_instance.evaluated_answer}"
+    def grade_and_record(self, question_instance, user_answer, time_spent, difficulty, manager):
+        """
+        Grade once, log the attempt and update progression. Runs on the
+        grading thread, so it must not touch any widget.
+        """
+        grade = grade_submission(question_instance, user_answer, time_spent,
+                                 getattr(self.app_window, "reference_cache", None))
+        self.store_user_data(grade, difficulty, question_instance)
 
-        self.question_label.setText(feedback)
+        stats = self.topic_stats()
+        mastered = manager.is_topic_mastered(self.selected_topic, stats)
+        newly_mastered, newly_unlocked = manager.check_and_update_progress({self.selected_topic: stats})
+        return SubmissionResult(grade, mastered, newly_mastered)
+
+    def on_answer_graded(self, result):
+        """Apply a graded submission to the UI and the Q-learning agent (GUI thread)."""
+        grade = result.grade
+        correct = grade.correct
+
+        # --- Feedback ---
+        self.question_label.setText(grade.feedback())
 
         # --- Update Q-learning ---
         reward = 1.0 if correct else 0.0
@@ -889,40 +1020,34 @@ class QuestionScreen(QWidget):
         next_state["total_questions"] += 1
         next_state["total_correct"] += int(correct)
 
-        self.q_learning_agent.update_q_table(self.difficulty, reward, next_state)
+        self.q_learning_agent.update_q_table(action_for_difficulty(self.difficulty), reward, next_state)
         self.q_learning_agent.state = next_state
+        self.app_window.save_agent_state()
 
-        # --- Store CSV data ---
-        self.store_user_data(user_answer, correct)
-        self.check_topic_mastery_and_notify()
+        # --- Choose the next difficulty once, now, so it is prefetched while feedback is read
+        # (prefetch() keeps the queue if it is unchanged) ---
+        self.next_difficulty = difficulty_for_action(self.q_learning_agent.choose_action())
+        self.prefetcher.prefetch(self.next_difficulty)
 
-        # --- Update topic progression ---
-        import pandas as pd
-        csv_path = os.path.join("courses", self.course_name, "user_data.csv")
-        df = pd.read_csv(csv_path)
+        self.check_topic_mastery_and_notify(result.mastered)
 
-        topic_index = next((i for i, t in enumerate(self.app_window.progression_manager.topics)
-                            if t == self.selected_topic), 0)
-        topic_df = df[df["topic"] == topic_index]
-
-        stats = {
-            "n_attempts": len(topic_df),
-            "n_correct": topic_df["correct"].sum(),
-            "avg_similarity": topic_df["submitted_answer"].mean(),
-            "streak": topic_df["correct_streak"].max() if not topic_df.empty else 0
-        }
-
-        newly_mastered, newly_unlocked = self.app_window.progression_manager.check_and_update_progress(
-            {self.selected_topic: stats}
-        )
-
-        # --- Refresh tree GUI ---
-        self.app_window.progression_screen.draw_tree()
+        # --- Refresh tree GUI only if a topic was completed ---
+        if result.newly_mastered:
+            self.app_window.progression_screen.draw_tree()
 
         # --- Enable next question ---
-        self.submit_button.setEnabled(False)
         self.next_button.setEnabled(True)
 
+    def on_grading_failed(self, error):
+        """Let the learner try again if grading raised."""
+        print(f"⚠️ Grading failed: {error}")
+        self.question_label.setText("⚠️ Could not check your answer. Please submit again.")
+        self.answer_input.setReadOnly(False)
+        if self.choices_group is not None:
+            for btn in self.choices_group.buttons():
+                btn.setEnabled(True)
+        self.submit_button.setEnabled(True)
+        self.timer.start(1000)
 
     def on_next_question(self):
         """Load another random question."""
@@ -932,88 +1057,24 @@ class QuestionScreen(QWidget):
         """Return to the progression tree screen."""
         self.app_window.stack.setCurrentWidget(self.app_window.progression_screen)
 
-    def store_user_data(self, user_answer, correct):
-        """Save numeric or text results to user_data.csv inside the course folder."""
-
-        file_path = os.path.join("courses", self.course_name, "user_data.csv")
-        file_exists = os.path.isfile(file_path)
-
-        # --- Get topic index ---
-        topic_id = 0
-        try:
-            topics = load_course_tree(self.course_name)
-            topic_obj = next((t for t in topics if t.name == self.selected_topic), None)
-            topic_id = topics.index(topic_obj) if topic_obj else 0
-        except Exception as e:
-            print(f"⚠️ Could not determine topic index: {e}")
-
-        qtype = getattr(self.question_instance, "question_type", 0)
-        exact_match = getattr(self.question_instance, "exact_match", False)
-        correct_flag = int(correct)
-
-        submitted_numeric = 0.0
-        correct_numeric = 0.0
-
-        if qtype == 2:  # text question
-            from nlp_utils import get_text_similarity
-            try:
-                if exact_match:
-                    submitted_numeric = 1.0 if str(user_answer).strip().lower() == str(self.correct_answer).strip().lower() else 0.0
-                else:
-                    submitted_numeric = get_text_similarity(user_answer, self.correct_answer)
-                correct_numeric = 1.0 if correct else 0.0
-            except Exception as e:
-                print(f"⚠️ Could not compute text similarity: {e}")
-                submitted_numeric = 0.0
-                correct_numeric = 0.0
-        else:
-            # numeric or multiple-choice
-            try:
-                submitted_numeric = float(user_answer)
-            except Exception:
-                submitted_numeric = 0.0
-            try:
-                correct_numeric = float(self.correct_answer)
-            except Exception:
-                correct_numeric = 0.0
-
-        # --- Handle streak ---
-        prev_streak = 0
-        if os.path.exists(file_path):
-            import pandas as pd
-            df = pd.read_csv(file_path)
-            if not df.empty and "correct_streak" in df.columns:
-                prev_streak = int(df["correct_streak"].iloc[-1]) if df["correct"].iloc[-1] == 1 else 0
-        new_streak = prev_streak + 1 if correct_flag else 0
-
-        # --- Write data row ---
-        fieldnames = [
-            "time_on_question",
-            "difficulty",
-            "topic",
-            "question_type",
-            "submitted_answer",
-            "correct_answer",
-            "correct",
-            "correct_streak"
-        ]
-
-        row = {
-            "time_on_question": float(self.time_spent),
-            "difficulty": int(self.difficulty) if str(self.difficulty).isdigit() else 1,
-            "topic": int(topic_id),
-            "question_type": int(qtype),
-            "submitted_answer": submitted_numeric,
-            "correct_answer": correct_numeric,
-            "correct": correct_flag,
-            "correct_streak": new_streak
-        }
-
-        with open(file_path, "a", newline="") as f:
-            writer = csv.DictWriter(f, fieldnames=fieldnames)
-            if not file_exists:
-                writer.writeheader()
-            writer.writerow(row)
+    def store_user_data(self, grade, difficulty, question_instance):
+        """Append a GradeResult to the learner's attempt log in this course."""
+        submitted_numeric, correct_numeric = grade.logged_values()
+
+        # --- Write data row; the store keeps the streak and topic aggregates up to date.
+        # Text answers are kept with their attempt so they can be re-graded later ---
+        row = self.attempt_store.record(
+            time_on_question=grade.time_spent,
+            difficulty=int(difficulty) if str(difficulty).isdigit() else 1,
+            topic=self.topic_id,
+            question_type=int(grade.question_type),
+            submitted_answer=submitted_numeric,
+            correct_answer=correct_numeric,
+            correct=grade.correct,
+            text_answer=grade.text_answer() if grade.question_type == 2 else None,
+            question_id=self.course_ids.question_id(question_instance),
+            seed=getattr(question_instance, "seed", None),
+        )
 
         print(f"✅ Saved data row: {row}")
 
@@ -1027,8 +1088,13 @@ class SkillSproutApp(QMainWindow):
         self.setWindowIcon(QIcon("sprout.png"))
         self.setGeometry(100, 100, 900, 650)
 
-        # --- Initialize Q-learning agent ---
-        self.q_learning_agent = AdaptiveDifficultyQlearning(csv_file=os.path.join(COURSES_DIR, "user_data.csv"))
+        # --- Learner profiles and their progress ---
+        self.progress_db = get_db()
+        self.learner_id = None
+        self.learner_name = None
+
+        # --- Grading, attempt logging and progression updates run off the GUI thread ---
+        self.grading_pipeline = GradingPipeline(self)
 
         # --- Stacked widget to manage multiple screens ---
         self.stack = QStackedWidget()
@@ -1036,18 +1102,21 @@ class SkillSproutApp(QMainWindow):
 
         # --- Screens ---
         self.main_menu = MainMenu(self)
+        self.learner_selection_screen = LearnerSelectionScreen(self, self)
         self.course_selection_screen = CourseSelectionScreen(self, self)
         self.design_course_screen = DesignCourseScreen(self)
 
         # Add screens to the stack
         self.stack.addWidget(self.main_menu)
+        self.stack.addWidget(self.learner_selection_screen)
         self.stack.addWidget(self.course_selection_screen)
         self.stack.addWidget(self.design_course_screen)
 
         # Connect buttons to navigate
-        self.main_menu.select_course_btn.clicked.connect(
-            lambda: self.stack.setCurrentWidget(self.course_selection_screen)
+        self.main_menu.select_learner_btn.clicked.connect(
+            lambda: self.stack.setCurrentWidget(self.learner_selection_screen)
         )
+        self.main_menu.select_course_btn.clicked.connect(self.show_course_selection)
         self.main_menu.design_course_btn.clicked.connect(
             lambda: self.stack.setCurrentWidget(self.design_course_screen)
         )
@@ -1056,12 +1125,70 @@ class SkillSproutApp(QMainWindow):
 
         self.showMaximized()
 
+    def set_learner(self, learner_id, name):
+        """Switch the learner whose progress is shown and recorded."""
+        self.learner_id = learner_id
+        self.learner_name = name
+        self.main_menu.learner_label.setText(f"Learner: {name}")
+        self.setWindowTitle(f"SkillSprout - {name}")
+
+    def show_course_selection(self):
+        # Progress is recorded per learner, so pick one before a course
+        if self.learner_id is None:
+            self.stack.setCurrentWidget(self.learner_selection_screen)
+        else:
+            self.stack.setCurrentWidget(self.course_selection_screen)
+
+    def save_agent_state(self):
+        """Checkpoint the learner's Q-learning agent for this course (written on the grading thread)."""
+        self.grading_pipeline.submit(
+            write_checkpoint, checkpoint_path(self.learner_id, self.current_course),
+            self.q_learning_agent.checkpoint(),
+            on_error=lambda e: print(f"⚠️ Could not save agent state: {e}")
+        )
+
     def show_progression_tree_screen(self, course_name):
+        if self.learner_id is None:
+            self.stack.setCurrentWidget(self.learner_selection_screen)
+            return
         self.current_course = course_name
 
-        # Initialize progression manager
+        course_dir = os.path.join("courses", course_name)
+        self.reference_cache = ReferenceEmbeddingCache(course_dir)
+        self.attempt_store = open_store(self.learner_id, course_name, self.progress_db)
+
+        # --- Q-learning agent of this learner in this course (resumed from its checkpoint) ---
+        self.q_learning_agent = AdaptiveDifficultyQlearning(attempt_store=self.attempt_store)
+        self.q_learning_agent.load_checkpoint(checkpoint_path(self.learner_id, course_name))
+
+        # The stable topic / question ids the attempt log uses, whether or not the course validates
+        try:
+            self.course_ids = course_ids(course_dir, self.progress_db)
+        except (OSError, ValueError, KeyError) as e:
+            print(f"⚠️ Could not read the topics of {course_name}: {e}")
+            self.course_ids = CourseIds(self.progress_db, course_name)
+
+        # Validate the course ahead of time (the result is cached next to the course)
+        try:
+            report = compile_course(course_dir)
+            if report["errors"]:
+                shown = "\n".join(report["errors"][:10])
+                more = len(report["errors"]) - 10
+                if more > 0:
+                    shown += f"\n... and {more} more"
+                QMessageBox.warning(self, "Course Problems", f"This course has errors:\n{shown}")
+
+            # Load the text-similarity model and reference embeddings in the background if needed
+            if report.get("n_text_questions"):
+                questions_path = course_questions_path(course_dir)
+                warm_up_async(self.reference_cache,
+                              lambda: text_reference_answers(get_question_bank(questions_path)))
+        except Exception as e:
+            print(f"⚠️ Course compilation failed: {e}")
+
+        # Initialize progression manager (the course file is only read)
         json_path = os.path.join("courses", course_name, "progressiontree.json")
-        self.progression_manager = ProgressionManager(json_path)
+        self.progression_manager = ProgressionManager(json_path, self.progress_db, self.learner_id, course_name)
 
         if hasattr(self, 'progression_screen'):
             self.stack.removeWidget(self.progression_screen)
@@ -1076,6 +1203,10 @@ class SkillSproutApp(QMainWindow):
     def show_question_screen(self, selected_topic):
         # Remove previous question_screen if exists
         if hasattr(self, 'question_screen'):
+            if hasattr(self.question_screen, 'prefetcher'):
+                self.question_screen.prefetcher.shutdown()
+            # Queued submissions are still logged, but not shown on the old screen
+            self.grading_pipeline.discard_callbacks()
             self.stack.removeWidget(self.question_screen)
             self.question_screen.deleteLater()
 
@@ -1086,6 +1217,13 @@ class SkillSproutApp(QMainWindow):
     def show_main_menu(self):
         self.stack.setCurrentWidget(self.main_menu)
 
+    def closeEvent(self, event):
+        # Finish grading queued answers and write every buffered attempt before exiting
+        self.grading_pipeline.wait()
+        if hasattr(self, "attempt_store"):
+            self.attempt_store.close()
+        super().closeEvent(event)
+
 
 def main():
     app = QApplication(sys.argv)
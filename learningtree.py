@@ -35,7 +35,7 @@ def load_learning_tree(file_path="learning_tree.json"):
         topic_nodes[topic["name"]] = TopicNode(
             name=topic["name"],
             prerequisites=[],  # We'll populate this in the next step
-            completed=topic["completed"]
+            completed=topic.get("completed", False)
         )
 
     # Link topics with their prerequisites
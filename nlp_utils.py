@@ -1,31 +1,447 @@
-from sentence_transformers import SentenceTransformer, util
+import hashlib
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict, namedtuple
+from functools import lru_cache
 
-# Load the model globally (only once)
-embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
+import numpy as np
+
+from embedding_backends import MODEL_NAME, create_backend
 
 SIMILARITY_THRESHOLD = 0.8  # You can tweak this
 
-def check_text_answer(user_answer: str, correct_answer: str, threshold: float = SIMILARITY_THRESHOLD) -> bool:
+# Lexical fast path: character-trigram similarity at or above LEXICAL_ACCEPT
+# is graded correct if the answer only differs from the reference by typos
+# (same words, each a small edit away), without running the model. The reject
+# band (similarity at or below LEXICAL_REJECT with no longer word in common is
+# graded incorrect) is off by default: synonyms such as "slope" for "gradient"
+# share no spelling, and catching them is what the model is for. A question
+# can set both bands and the threshold with a "grading" object in
+# questions.json; None disables a band.
+LEXICAL_ACCEPT = 0.9
+LEXICAL_REJECT = None
+GRADING_OPTIONS = ("threshold", "lexical_accept", "lexical_reject")
+
+# Which step of grade_text_answer decided a grade
+STAGE_EXACT = "exact"
+STAGE_LEXICAL_ACCEPT = "lexical-accept"
+STAGE_LEXICAL_REJECT = "lexical-reject"
+STAGE_EMPTY = "empty"
+STAGE_MODEL = "model"
+
+TextGrade = namedtuple("TextGrade", ["similarity", "correct", "stage"])
+
+# "torch" (sentence-transformers) or "onnx-int8" (quantized, CPU-only, no torch)
+EMBEDDING_BACKEND = os.environ.get("SKILLSPROUT_EMBEDDING_BACKEND", "torch")
+
+# The backend (and torch/onnxruntime) are loaded on first use, not at import time
+_embedding_model = None
+_model_lock = threading.Lock()
+
+# LRU of similarities keyed by normalized (answer, reference) pairs
+SIMILARITY_CACHE_SIZE = 2048
+_similarity_cache = OrderedDict()
+_similarity_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Return the shared embedding backend, loading it on first call."""
+    global _embedding_model
+    if _embedding_model is None:
+        with _model_lock:
+            if _embedding_model is None:
+                _embedding_model = create_backend(EMBEDDING_BACKEND)
+    return _embedding_model
+
+
+def embedding_id():
+    """Identifies the model + backend that produced stored embeddings."""
+    return f"{MODEL_NAME}/{EMBEDDING_BACKEND}"
+
+
+def warm_up_async(reference_cache=None, load_reference_answers=None):
+    """
+    Start loading the model on a background thread, optionally embedding a
+    course's reference answers into its cache as well. load_reference_answers
+    is called on that thread too, since collecting the answers reads the
+    whole question bank. Returns the thread.
+    """
+    thread = threading.Thread(target=_warm_up, args=(reference_cache, load_reference_answers),
+                              name="nlp-warm-up", daemon=True)
+    thread.start()
+    return thread
+
+
+def _grading_service():
+    # Imported here: the service module itself grades through this one
+    from grading_service import get_client
+    return get_client()
+
+
+def _warm_up(reference_cache, load_reference_answers):
+    try:
+        service = _grading_service()
+        if service is not None and service.ping() == embedding_id():
+            return  # a shared grading service holds the model; don't load another copy
+        get_embedding_model()
+        if reference_cache is not None and load_reference_answers is not None:
+            reference_answers = load_reference_answers()
+            if reference_answers:
+                reference_cache.get_matrix(reference_answers)
+    except Exception as e:
+        print(f"⚠️ Could not load text-similarity model: {e}")
+
+
+def encode(text):
+    """Unit-length embedding of one string as a float32 numpy vector."""
+    return get_embedding_model().encode([text])[0]
+
+
+def normalize_answer(text):
+    """Lower-case and collapse whitespace, so trivially different answers share a cache entry."""
+    return " ".join(str(text).split()).lower()
+
+
+def encode_batch(texts, batch_size=64):
+    """Unit-length embeddings of a list of strings as an (n, dim) float32 array."""
+    return get_embedding_model().encode(texts, batch_size=batch_size)
+
+
+def as_references(correct_answer):
+    """A text question's acceptable answers as a tuple of strings (from one string or a list)."""
+    if isinstance(correct_answer, (list, tuple)):
+        return tuple(str(a) for a in correct_answer if a is not None and str(a).strip())
+    if correct_answer is None or not str(correct_answer).strip():
+        return ()
+    return (str(correct_answer),)
+
+
+def answer_key(text):
+    """Content hash identifying a reference answer."""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class ReferenceEmbeddingCache:
+    """
+    Embeddings of a course's reference answers, computed once and kept in
+    <course>/reference_embeddings-<model>.npy (memory-mapped). Each record
+    holds an answer's content hash next to its embedding, so the keys and
+    rows can never come from different writes. Editing an answer changes
+    its hash, so stale rows are never used; prune() drops them.
+    """
+
+    def __init__(self, course_dir):
+        model = hashlib.sha256(embedding_id().encode("utf-8")).hexdigest()[:16]
+        self.npy_path = os.path.join(course_dir, f"reference_embeddings-{model}.npy")
+        self._lock = threading.Lock()
+        self._rows = {}
+        self._matrix = None
+        self._stacks = {}  # tuple of answers -> stacked (k, dim) embeddings
+        self._load()
+
+    def _load(self):
+        self._rows, self._matrix = {}, None
+        try:
+            records = np.load(self.npy_path, mmap_mode="r")
+        except FileNotFoundError:
+            return
+        except (OSError, ValueError) as e:
+            print(f"⚠️ Ignoring reference embedding cache {self.npy_path}: {e}")
+            return
+        if records.dtype.names != ("key", "embedding") or records.ndim != 1:
+            print(f"⚠️ Ignoring reference embedding cache {self.npy_path}: unexpected layout")
+            return
+        self._rows = {key.decode("ascii"): i for i, key in enumerate(records["key"].tolist())}
+        self._matrix = records["embedding"]
+
+    def get(self, text):
+        """Return the embedding for a reference answer, encoding and storing it if new."""
+        return self.get_matrix((text,))[0].copy()
+
+    def get_matrix(self, texts):
+        """
+        Stacked embeddings of several reference answers as a read-only
+        (len(texts), dim) array, encoding any new ones in a single batch.
+        The stack for each tuple of answers is built once and reused.
+        """
+        texts = tuple(texts)
+        with self._lock:
+            stacked = self._stacks.get(texts)
+            if stacked is not None:
+                return stacked
+            missing = [t for t in dict.fromkeys(texts) if answer_key(t) not in self._rows]
+
+        if missing:
+            embeddings = encode_batch(missing)
+            with self._lock:
+                new = [(answer_key(t), e) for t, e in zip(missing, embeddings) if answer_key(t) not in self._rows]
+                if new:
+                    rows = dict(self._rows)
+                    for key, _ in new:
+                        rows[key] = len(rows)
+                    self._write(rows, self._stacked(np.array([e for _, e in new])))
+
+        with self._lock:
+            stacked = np.array(self._matrix[[self._rows[answer_key(t)] for t in texts]])
+            stacked.flags.writeable = False
+            self._stacks[texts] = stacked
+            return stacked
+
+    def prune(self, texts):
+        """Keep only the embeddings of `texts` (the answers still in the course)."""
+        keep = {answer_key(t) for t in texts}
+        with self._lock:
+            if self._matrix is None or keep.issuperset(self._rows):
+                return
+            kept = [(key, row) for key, row in self._rows.items() if key in keep]
+            matrix = np.asarray(self._matrix)[[row for _, row in kept]]
+            self._write({key: i for i, (key, _) in enumerate(kept)}, matrix)
+
+    def _stacked(self, embeddings):
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self._matrix is None or len(self._matrix) == 0:
+            return embeddings
+        return np.vstack([self._matrix, embeddings])
+
+    def _write(self, rows, matrix):
+        # Write a uniquely named file (other app instances may be writing too) and
+        # swap it in with one rename. Rows are handed out as copies, so our map
+        # can be dropped just before the rename; if anything fails, the state we
+        # had is re-read from the untouched old file.
+        matrix = np.asarray(matrix, dtype=np.float32)
+        records = np.empty(len(matrix), dtype=[("key", "S64"), ("embedding", "<f4", matrix.shape[1:])])
+        records["key"] = [key.encode("ascii") for key in sorted(rows, key=rows.get)]
+        records["embedding"] = matrix
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(self.npy_path) or ".", suffix=".tmp.npy")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, records)
+            self._matrix = None
+            os.replace(tmp_path, self.npy_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self._load()
+            raise
+        self._stacks = {}
+        self._load()
+
+
+def check_text_answer(user_answer: str, correct_answer: str, threshold: float = SIMILARITY_THRESHOLD,
+                      reference_cache=None) -> bool:
     """
     Returns True if the user's answer is semantically similar to the correct answer.
     """
-    if not user_answer or not correct_answer:
+    return grade_text_answer(user_answer, correct_answer, threshold,
+                             reference_cache=reference_cache).correct
+
+@lru_cache(maxsize=4096)
+def _trigrams(normalized):
+    padded = f" {normalized} "
+    return Counter(padded[i:i + 3] for i in range(len(padded) - 2))
+
+
+# Words that flip an answer's meaning; they must appear exactly where the reference has them
+NEGATION_WORDS = frozenset({
+    "no", "not", "never", "none", "nothing", "nobody", "neither", "nor", "cannot", "without",
+})
+
+
+def _edit_distance(a, b):
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        previous = current
+    return previous[-1]
+
+
+def _is_negation(word):
+    return word in NEGATION_WORDS or word.endswith("n't")
+
+
+def _only_typos(user, reference):
+    """
+    True if two normalized answers have the same words in the same order,
+    each at most a typo apart (one edit, or two for words of 8+ letters).
+    An added, dropped or changed negation is never a typo.
+    """
+    user_words, reference_words = user.split(), reference.split()
+    if len(user_words) != len(reference_words):
         return False
+    for a, b in zip(user_words, reference_words):
+        if a == b:
+            continue
+        if _is_negation(a) or _is_negation(b):
+            return False
+        if _edit_distance(a, b) > (2 if min(len(a), len(b)) >= 8 else 1):
+            return False
+    return True
+
+
+def _content_words(normalized):
+    # Short words ("a", "of", "the") say nothing about whether two answers are related
+    return {word for word in normalized.split() if len(word) > 3}
+
+
+def lexical_similarity(user_answer, correct_answer):
+    """Dice coefficient (0-1) of the character trigrams of two normalized answers."""
+    a = _trigrams(normalize_answer(user_answer))
+    b = _trigrams(normalize_answer(correct_answer))
+    total = sum(a.values()) + sum(b.values())
+    return 2 * sum((a & b).values()) / total if total else 0.0
+
+
+def lexical_grade(user_answer, correct_answer, lexical_accept=LEXICAL_ACCEPT, lexical_reject=LEXICAL_REJECT):
+    """
+    The cheap stages of grade_text_answer: a TextGrade if the answer is
+    empty, an exact match, a typo of a reference inside the accept band or
+    clearly inside the reject band, otherwise None.
+    """
+    user = normalize_answer("" if user_answer is None else user_answer)
+    references = [normalize_answer(r) for r in as_references(correct_answer)]
+    if not user or not references:
+        return TextGrade(0.0, False, STAGE_EMPTY)
+    if user in references:
+        return TextGrade(1.0, True, STAGE_EXACT)
 
-    user_emb = embedding_model.encode(user_answer, convert_to_tensor=True)
-    correct_emb = embedding_model.encode(correct_answer, convert_to_tensor=True)
+    scores = [lexical_similarity(user, r) for r in references]
+    score = max(scores)
+    if lexical_accept is not None:
+        # Similar spelling is not similar meaning: only typos skip the model
+        accepted = [s for s, r in zip(scores, references) if s >= lexical_accept and _only_typos(user, r)]
+        if accepted:
+            return TextGrade(max(accepted), True, STAGE_LEXICAL_ACCEPT)
+    if lexical_reject is not None and score <= lexical_reject:
+        words = _content_words(user)
+        if not any(words & _content_words(r) for r in references):
+            return TextGrade(score, False, STAGE_LEXICAL_REJECT)
+    return None
 
-    similarity = util.pytorch_cos_sim(user_emb, correct_emb).item()
-    return similarity >= threshold
 
-def get_text_similarity(user_answer: str, correct_answer: str) -> float:
+def grade_text_answer(user_answer, correct_answer, threshold=SIMILARITY_THRESHOLD,
+                      lexical_accept=LEXICAL_ACCEPT, lexical_reject=LEXICAL_REJECT,
+                      reference_cache=None):
     """
-    Returns the cosine similarity score (0-1) between user answer and correct answer.
+    Grade a free-text answer against one reference answer or a list of
+    them with a cascade: normalized exact match, then character-trigram
+    similarity, and the embedding model only for answers between the
+    lexical bands. Returns a TextGrade naming the deciding stage.
     """
-    if not user_answer or not correct_answer:
+    grade = lexical_grade(user_answer, correct_answer, lexical_accept, lexical_reject)
+    if grade is not None:
+        return grade
+    similarity = get_text_similarity(user_answer, correct_answer, reference_cache)
+    return TextGrade(similarity, similarity >= threshold, STAGE_MODEL)
+
+
+def get_text_similarity(user_answer: str, correct_answer: str, reference_cache=None) -> float:
+    """
+    Returns the cosine similarity score (0-1) between user answer and correct
+    answer; for a list of correct answers, the best score against any of
+    them. With a ReferenceEmbeddingCache only the user's answer is encoded.
+    When a grading service is running (see grading_service.py) it scores
+    the answer instead of a model in this process.
+    """
+    references = as_references(correct_answer)
+    if not user_answer or not references:
         return 0.0
 
-    user_emb = embedding_model.encode(user_answer, convert_to_tensor=True)
-    correct_emb = embedding_model.encode(correct_answer, convert_to_tensor=True)
+    key = (normalize_answer(user_answer), tuple(normalize_answer(r) for r in references))
+    with _similarity_lock:
+        similarity = _similarity_cache.get(key)
+        if similarity is not None:
+            _similarity_cache.move_to_end(key)
+            return similarity
+
+    service = _grading_service()
+    similarity = service.similarity(user_answer, references) if service is not None else None
+    if similarity is None:
+        if reference_cache is not None:
+            reference_matrix = reference_cache.get_matrix(references)
+        else:
+            reference_matrix = encode_batch(list(references))
+        # One matrix-vector product however many references there are
+        similarity = float(np.max(reference_matrix @ encode(user_answer)))
+
+    with _similarity_lock:
+        _similarity_cache[key] = similarity
+        if len(_similarity_cache) > SIMILARITY_CACHE_SIZE:
+            _similarity_cache.popitem(last=False)
+    return similarity
+
+
+def get_text_similarities(user_answers, correct_answers, batch_size=64, chunk_size=8192,
+                          encode_references=None):
+    """
+    Cosine similarity for many (answer, reference) pairs at once.
+
+    Answers are encoded in chunks of `chunk_size` (each run through the model
+    in batches of `batch_size`); each distinct reference is encoded only
+    once. A correct answer may be a list, in which case the best score
+    against any of its references is kept. Similarities for a chunk are one
+    row-wise dot product over all (answer, reference) pairs. Pairs with an
+    empty side score 0.0, as in get_text_similarity.
+
+    `encode_references(texts)` may supply the reference embeddings instead
+    of encoding them here (the grading service keeps them cached).
+    """
+    user_answers = ["" if a is None else str(a) for a in user_answers]
+    references_per_row = [as_references(c) for c in correct_answers]
+    if len(user_answers) != len(references_per_row):
+        raise ValueError("user_answers and correct_answers must have the same length")
+
+    similarities = np.zeros(len(user_answers), dtype=np.float32)
+    valid = np.array([bool(u) and bool(r) for u, r in zip(user_answers, references_per_row)], dtype=bool)
+    if not valid.any():
+        return similarities
+
+    references = sorted({r for refs, ok in zip(references_per_row, valid) if ok for r in refs})
+    ref_index = {r: i for i, r in enumerate(references)}
+    if encode_references is not None:
+        ref_matrix = encode_references(references)
+    else:
+        ref_matrix = encode_batch(references, batch_size)
+
+    rows = np.flatnonzero(valid)
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        user_matrix = encode_batch([user_answers[i] for i in chunk], batch_size)
+        # Expand each answer against every one of its references, then keep the best
+        pair_rows = np.repeat(np.arange(len(chunk)), [len(references_per_row[i]) for i in chunk])
+        pair_refs = [ref_index[r] for i in chunk for r in references_per_row[i]]
+        scores = np.einsum("ij,ij->i", user_matrix[pair_rows], ref_matrix[pair_refs])
+        best = np.full(len(chunk), -np.inf, dtype=np.float32)
+        np.maximum.at(best, pair_rows, scores)
+        similarities[chunk] = best
+    return similarities
+
+
+# Answers the lexical stages must leave to the model with the default bands:
+# correct paraphrases that share no spelling, and negations of the reference
+MODEL_ONLY_PAIRS = [
+    ("slope", "gradient"),
+    ("car", "automobile"),
+    ("big", "large"),
+    ("the derivative", "rate of change"),
+    ("sine", "opposite over hypotenuse"),
+    ("the function is not continuous at zero", "the function is continuous at zero"),
+    ("the derivative of a constant is not zero", "the derivative of a constant is zero"),
+]
+
+
+def check_lexical_shortcuts(pairs=MODEL_ONLY_PAIRS):
+    """The (answer, reference, grade) pairs the default lexical bands decide without the model."""
+    return [(answer, reference, grade) for answer, reference in pairs
+            if (grade := lexical_grade(answer, reference)) is not None]
+
 
-    return util.pytorch_cos_sim(user_emb, correct_emb).item()
+if __name__ == "__main__":
+    failures = check_lexical_shortcuts()
+    for answer, reference, grade in failures:
+        print(f"❌ '{answer}' vs '{reference}' decided by {grade.stage} without the model")
+    if not failures:
+        print(f"✅ All {len(MODEL_ONLY_PAIRS)} paraphrase/negation pairs reach the model")
+    raise SystemExit(1 if failures else 0)
@@ -0,0 +1,298 @@
+import itertools
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+# One database holds the progress of every learner on this install
+PROGRESS_DB = os.environ.get("SKILLSPROUT_PROGRESS_DB", "progress.db")
+
+SCHEMA_VERSION = 1
+BUSY_TIMEOUT = 30.0  # seconds a writer waits for another session's transaction
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS learners (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE,
+    created REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS attempts (
+    learner_id INTEGER NOT NULL REFERENCES learners(id) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    time_on_question REAL NOT NULL,
+    difficulty INTEGER NOT NULL,
+    topic INTEGER NOT NULL,
+    question_type INTEGER NOT NULL,
+    submitted_answer REAL NOT NULL,
+    correct_answer REAL NOT NULL,
+    correct INTEGER NOT NULL,
+    correct_streak INTEGER NOT NULL,
+    answered_at REAL,
+    question_id INTEGER NOT NULL DEFAULT -1,
+    seed INTEGER NOT NULL DEFAULT -1,
+    PRIMARY KEY (learner_id, course, attempt)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS attempts_by_topic ON attempts (learner_id, course, topic);
+CREATE INDEX IF NOT EXISTS attempts_by_question ON attempts (learner_id, course, question_id);
+
+CREATE TABLE IF NOT EXISTS text_answers (
+    learner_id INTEGER NOT NULL,
+    course TEXT NOT NULL,
+    attempt INTEGER NOT NULL,
+    reference TEXT NOT NULL,
+    answer TEXT,
+    exact_match INTEGER NOT NULL,
+    similarity REAL,
+    correct INTEGER NOT NULL,
+    stage TEXT,
+    PRIMARY KEY (learner_id, course, attempt),
+    FOREIGN KEY (learner_id, course, attempt)
+        REFERENCES attempts(learner_id, course, attempt) ON DELETE CASCADE
+) WITHOUT ROWID;
+
+-- Attempts recorded but not yet appended to `attempts` (see attempt_store.AttemptStore)
+CREATE TABLE IF NOT EXISTS pending_attempts (
+    id INTEGER PRIMARY KEY,
+    learner_id INTEGER NOT NULL REFERENCES learners(id) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    pid INTEGER NOT NULL,
+    answered_at REAL NOT NULL,
+    attempt TEXT NOT NULL,
+    text_answer TEXT
+);
+
+CREATE INDEX IF NOT EXISTS pending_by_course ON pending_attempts (learner_id, course);
+
+CREATE TABLE IF NOT EXISTS topic_stats (
+    learner_id INTEGER NOT NULL REFERENCES learners(id) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    topic INTEGER NOT NULL,
+    attempts INTEGER NOT NULL,
+    correct INTEGER NOT NULL,
+    similarity_sum REAL NOT NULL,
+    time_sum REAL NOT NULL,
+    streak INTEGER NOT NULL,
+    max_streak INTEGER NOT NULL,
+    PRIMARY KEY (learner_id, course, topic)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS completed_topics (
+    learner_id INTEGER NOT NULL REFERENCES learners(id) ON DELETE CASCADE,
+    course TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    completed_at REAL NOT NULL,
+    PRIMARY KEY (learner_id, course, topic)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS interned_keys (
+    course TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    key TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    PRIMARY KEY (course, kind, key),
+    UNIQUE (course, kind, id)
+) WITHOUT ROWID;
+
+-- Fingerprint of the course files whose keys were last interned
+CREATE TABLE IF NOT EXISTS interned_courses (
+    course TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL
+) WITHOUT ROWID;
+"""
+
+# Statements that bring a database at version N - 1 up to N, run before SCHEMA
+MIGRATIONS = {}
+
+
+class ProgressDB:
+    """
+    Learner profiles and everything they do: attempts, text answers,
+    per-topic stats and completed topics, all keyed by learner and course.
+    Course folders are never written at runtime, and Q-learning agents are
+    checkpointed to files (see adaptivedifficulty.checkpoint_path).
+
+    The database runs in WAL mode, so any number of app instances (and
+    threads) can read while one writes, and writers queue behind each
+    other for up to BUSY_TIMEOUT seconds instead of interleaving. Each
+    thread gets its own connection.
+    """
+
+    def __init__(self, path=PROGRESS_DB):
+        self.path = path
+        self._local = threading.local()
+        if self.connection().execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            self._upgrade()
+
+    def _upgrade(self):
+        with self.transaction() as conn:
+            # Checked again under the write lock: another session may have just upgraded
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= SCHEMA_VERSION:
+                return
+            statements = [MIGRATIONS[v] for v in range(version + 1, SCHEMA_VERSION + 1)
+                          if version and v in MIGRATIONS]
+            statements += SCHEMA.split(";")
+            for statement in statements:
+                if statement.strip():
+                    conn.execute(statement)
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def connection(self):
+        """This thread's connection (autocommit; use transaction() to group writes)."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=FULL")
+            conn.execute("PRAGMA foreign_keys=ON")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self, write=True, synchronous="FULL"):
+        """
+        Run a block as one transaction. Write transactions take the write
+        lock up front, so read-then-write blocks cannot race another session.
+        With synchronous="NORMAL" the commit survives the app crashing but
+        not the machine losing power (it skips the fsync).
+        """
+        conn = self.connection()
+        if synchronous != "FULL":
+            conn.execute(f"PRAGMA synchronous={synchronous}")
+        try:
+            conn.execute("BEGIN IMMEDIATE" if write else "BEGIN")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            if synchronous != "FULL":
+                conn.execute("PRAGMA synchronous=FULL")
+
+    def optimize(self):
+        """Refresh the query planner's statistics so the topic / question indexes get used."""
+        self.connection().execute("PRAGMA optimize")
+
+    # --------------------
+    # Learners
+    # --------------------
+    def learners(self):
+        """[(learner_id, name)] sorted by name."""
+        return self.connection().execute("SELECT id, name FROM learners ORDER BY name COLLATE NOCASE").fetchall()
+
+    def add_learner(self, name):
+        """Create a learner profile and return its id."""
+        name = str(name).strip()
+        if not name:
+            raise ValueError("Learner name cannot be empty")
+        try:
+            with self.transaction() as conn:
+                cursor = conn.execute("INSERT INTO learners (name, created) VALUES (?, ?)", (name, time.time()))
+                return cursor.lastrowid
+        except sqlite3.IntegrityError:
+            raise ValueError(f"A learner named '{name}' already exists")
+
+    def learner_id(self, name):
+        row = self.connection().execute("SELECT id FROM learners WHERE name = ?", (name,)).fetchone()
+        return None if row is None else row[0]
+
+    def delete_learner(self, learner_id):
+        """Remove a learner and all of their progress."""
+        with self.transaction() as conn:
+            conn.execute("DELETE FROM learners WHERE id = ?", (learner_id,))
+
+    # --------------------
+    # Topic completion
+    # --------------------
+    def completed_topics(self, learner_id, course):
+        rows = self.connection().execute(
+            "SELECT topic FROM completed_topics WHERE learner_id = ? AND course = ?", (learner_id, course))
+        return {topic for topic, in rows}
+
+    def mark_completed(self, learner_id, course, topics):
+        """Mark topics completed; returns the ones that were not already (by any session)."""
+        newly_completed = []
+        with self.transaction() as conn:
+            for topic in topics:
+                cursor = conn.execute(
+                    "INSERT OR IGNORE INTO completed_topics (learner_id, course, topic, completed_at) "
+                    "VALUES (?, ?, ?, ?)", (learner_id, course, topic, time.time()))
+                if cursor.rowcount:
+                    newly_completed.append(topic)
+        return newly_completed
+
+    # --------------------
+    # Interned course keys
+    # --------------------
+    def intern(self, course, kind, keys, chunk_size=500):
+        """
+        Give a course's topic or question keys ids. A key keeps the id it
+        was first given; new keys get the next ids in the order given, so
+        a new course's topics are numbered in progressiontree order. `keys`
+        may be any iterable; it is read in chunks, so memory stays flat.
+        Returns the number of new keys.
+        """
+        n_new = 0
+        with self.transaction() as conn:
+            next_id = conn.execute("SELECT COALESCE(MAX(id), -1) + 1 FROM interned_keys WHERE course = ? AND kind = ?",
+                                   (course, kind)).fetchone()[0]
+            keys = iter(keys)
+            while True:
+                chunk = list(dict.fromkeys(itertools.islice(keys, chunk_size)))
+                if not chunk:
+                    break
+                known = {key for key, in conn.execute(
+                    f"SELECT key FROM interned_keys WHERE course = ? AND kind = ? "
+                    f"AND key IN ({', '.join('?' * len(chunk))})", (course, kind, *chunk))}
+                new = [(course, kind, key, next_id + i) for i, key in enumerate(k for k in chunk if k not in known)]
+                conn.executemany("INSERT INTO interned_keys (course, kind, key, id) VALUES (?, ?, ?, ?)", new)
+                next_id += len(new)
+                n_new += len(new)
+        return n_new
+
+    def interned_ids(self, course, kind):
+        """{key: id} of every interned key of one kind (meant for the few topics of a course)."""
+        return dict(self.connection().execute(
+            "SELECT key, id FROM interned_keys WHERE course = ? AND kind = ?", (course, kind)))
+
+    def interned_id(self, course, kind, key):
+        row = self.connection().execute(
+            "SELECT id FROM interned_keys WHERE course = ? AND kind = ? AND key = ?", (course, kind, key)).fetchone()
+        return None if row is None else row[0]
+
+    def interned_key(self, course, kind, key_id):
+        row = self.connection().execute(
+            "SELECT key FROM interned_keys WHERE course = ? AND kind = ? AND id = ?", (course, kind, key_id)).fetchone()
+        return None if row is None else row[0]
+
+    def interned_fingerprint(self, course):
+        """The fingerprint set_interned_fingerprint recorded for a course, or None."""
+        row = self.connection().execute(
+            "SELECT fingerprint FROM interned_courses WHERE course = ?", (course,)).fetchone()
+        return None if row is None else row[0]
+
+    def set_interned_fingerprint(self, course, fingerprint):
+        with self.transaction() as conn:
+            conn.execute("INSERT INTO interned_courses (course, fingerprint) VALUES (?, ?) "
+                         "ON CONFLICT (course) DO UPDATE SET fingerprint = excluded.fingerprint",
+                         (course, fingerprint))
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def get_db():
+    """The process-wide ProgressDB, opened on first use."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = ProgressDB(PROGRESS_DB)
+        return _db
@@ -1,10 +1,20 @@
 import json
-from typing import Dict, List, Tuple
+from typing import Dict, List, Set, Tuple
 
 class ProgressionManager:
-    def __init__(self, json_path: str):
+    """
+    Mastery and unlocking for one learner in one course. progressiontree.json
+    is only read; which topics the learner completed is kept in the
+    progress database (or just in memory when no database is given).
+    """
+
+    def __init__(self, json_path: str, db=None, learner_id=None, course=None):
         self.json_path = json_path
         self.topics = self._load_topics()
+        self.db = db
+        self.learner_id = learner_id
+        self.course = course
+        self.completed: Set[str] = set(db.completed_topics(learner_id, course)) if db is not None else set()
 
     # --------------------
     # File I/O
@@ -14,9 +24,8 @@ class ProgressionManager:
             data = json.load(f)
         return {t["name"]: t for t in data["topics"]}
 
-    def save_topics(self):
-        with open(self.json_path, "w") as f:
-            json.dump({"topics": list(self.topics.values())}, f, indent=2)
+    def is_completed(self, topic_name: str) -> bool:
+        return topic_name in self.completed
 
     # --------------------
     # Mastery logic
@@ -57,18 +66,25 @@ class ProgressionManager:
         if not topic:
             return False
         prereqs = topic.get("prerequisites", [])
-        return all(self.topics[p]["completed"] for p in prereqs)
+        return all(p in self.completed for p in prereqs)
 
     def unlock_available_topics(self) -> List[str]:
         available = []
         for name, info in self.topics.items():
-            if not info["completed"] and self.can_unlock(name):
+            if name not in self.completed and self.can_unlock(name):
                 available.append(name)
         return available
 
-    def mark_topic_completed(self, topic_name: str):
-        if topic_name in self.topics:
-            self.topics[topic_name]["completed"] = True
+    def mark_topics_completed(self, topic_names: List[str]) -> List[str]:
+        """Record completions; returns the topics no session had completed before."""
+        topic_names = [t for t in topic_names if t in self.topics]
+        if self.db is not None:
+            newly_completed = self.db.mark_completed(self.learner_id, self.course, topic_names)
+        else:
+            newly_completed = [t for t in topic_names if t not in self.completed]
+        # Replace rather than mutate: the GUI thread reads this set while the grading thread updates it
+        self.completed = self.completed | set(topic_names)
+        return newly_completed
 
     # --------------------
     # Main progression update
@@ -80,15 +96,11 @@ class ProgressionManager:
 
         Returns: (newly_mastered_topics, newly_unlocked_topics)
         """
-        newly_mastered = []
-
-        for topic_name, stats in topic_stats.items():
-            if self.is_topic_mastered(topic_name, stats):
-                if not self.topics[topic_name]["completed"]:
-                    self.mark_topic_completed(topic_name)
-                    newly_mastered.append(topic_name)
-
+        mastered = [
+            topic_name for topic_name, stats in topic_stats.items()
+            if topic_name not in self.completed and self.is_topic_mastered(topic_name, stats)
+        ]
+        newly_mastered = self.mark_topics_completed(mastered) if mastered else []
         newly_unlocked = self.unlock_available_topics()
-        self.save_topics()
 
         return newly_mastered, newly_unlocked
@@ -1,7 +1,29 @@
 import random
 import json
-import copy
 import os
+import hashlib
+import secrets
+from functools import cached_property
+import numpy as np
+from answer_expression import compile_answer_expression, AnswerExpressionError
+
+# Served instances are drawn from a per-instance seed, so (question id, seed) is
+# enough to regenerate exactly what a learner saw. Seeds are non-negative and
+# fit the signed 64-bit columns they are logged in.
+SEED_BITS = 63
+
+
+def new_seed():
+    """A fresh random seed for one question instance."""
+    return secrets.randbits(SEED_BITS)
+
+
+def seeded_rng(seed):
+    """
+    The Generator an instance's parameters are drawn from: a counter-based
+    Philox stream keyed by the seed, so it needs no state beyond the seed.
+    """
+    return np.random.Generator(np.random.Philox(key=seed))
 
 class Question:
     def __init__(self,
@@ -14,7 +36,8 @@ class Question:
                  is_integer=False,
                  question_type=0,
                  choices=None,
-                 exact_match=False):
+                 exact_match=False,
+                 grading=None):
         self.question_text = question_text
         self.difficulty = difficulty
         self.params = params or {}
@@ -25,24 +48,71 @@ class Question:
         self.question_type = question_type  # 0 numeric, 1 multiple-choice, 2 text
         self.choices = choices or []
         self.exact_match = exact_match
+        self.grading = grading or {}  # per-question text grading overrides (see nlp_utils)
         self.evaluated_answer = None
         self.randomized_params = {}
+        self.answer_expr = None
+        self.answer_error = None
+        self.compile_answer()
+
+    @cached_property
+    def key(self):
+        """
+        Content key of this question: the same definition always gets the
+        same key, so the course compiler can intern it into a stable id.
+        """
+        definition = [self.question_text, self.question_type, self.difficulty, self.params,
+                      self.randomize, self.correct_answer, self.choices, self.is_integer]
+        encoded = json.dumps(definition, sort_keys=True, default=str).encode("utf-8")
+        return hashlib.sha1(encoded).hexdigest()[:16]
 
-    def generate_param_value(self, param_config):
-        """Generate a parameter value (gaussian) and round if integer."""
+    def compile_answer(self):
+        """Compile a templated correct_answer once, recording any error."""
+        self.answer_expr = None
+        self.answer_error = None
+        if not (isinstance(self.correct_answer, str) and "{" in self.correct_answer):
+            return
+        try:
+            expr = compile_answer_expression(self.correct_answer)
+            unknown = [name for name in expr.param_names if name not in self.params]
+            if unknown:
+                raise AnswerExpressionError(
+                    f"unknown parameter(s) {', '.join(unknown)} in '{self.correct_answer}'")
+            self.answer_expr = expr
+        except AnswerExpressionError as e:
+            self.answer_error = str(e)
+
+    def generate_param_value(self, param_config, rng=None):
+        """
+        Generate a parameter value (gaussian) and round if integer.
+        Draws from `rng` (a numpy Generator) when given, else from `random`.
+        """
         base_value = param_config.get("value", 0)
         sd = param_config.get("sd", 0)
-        value = random.gauss(base_value, sd)
-        return int(round(value)) if self.is_integer else round(value, 2)
+        if rng is None:
+            value = random.gauss(base_value, sd)
+        else:
+            value = base_value + sd * rng.standard_normal()
+        return int(round(value)) if self.is_integer else float(np.round(value, 2))
+
+    @staticmethod
+    def fixed_param_value(values):
+        return values.get("value", values) if isinstance(values, dict) else values
 
-    def generate_question(self):
-        """Generate question text and evaluate numeric correct answer."""
+    def instantiate(self, rng=None, seed=None):
+        """
+        Sample parameters and return an immutable QuestionInstance of this
+        template. With `seed` the parameters come from seeded_rng(seed) and
+        the instance records the seed, so the same seed rebuilds it exactly.
+        """
+        if seed is not None:
+            rng = seeded_rng(seed)
         randomized_params = {}
         for param, values in self.params.items():
             if self.randomize:
-                randomized_params[param] = self.generate_param_value(values)
+                randomized_params[param] = self.generate_param_value(values, rng)
             else:
-                randomized_params[param] = values.get("value", values) if isinstance(values, dict) else values
+                randomized_params[param] = self.fixed_param_value(values)
 
         # Format question text
         try:
@@ -52,46 +122,46 @@ class Question:
             question_text = self.question_text
 
         # Evaluate correct answer
-        correct_answer_val = self.correct_answer
-        if isinstance(self.correct_answer, str) and "{" in self.correct_answer:
-            try:
-                expr = self.correct_answer.format(**randomized_params)
-                correct_answer_val = eval(expr, {"__builtins__": {}})
-            except Exception as e:
-                print(f"⚠️ Error evaluating correct_answer '{self.correct_answer}' with {randomized_params}: {e}")
-                correct_answer_val = 0
-
-        # Ensure numeric type
         try:
-            correct_answer_val = float(correct_answer_val)
-        except Exception:
-            correct_answer_val = correct_answer_val
+            correct_answer_val = self._evaluate_answer(randomized_params)
+        except Exception as e:
+            print(f"⚠️ Error evaluating correct_answer '{self.correct_answer}' with {randomized_params}: {e}")
+            correct_answer_val = 0
 
-        if self.is_integer and correct_answer_val is not None:
-            try:
-                correct_answer_val = int(round(correct_answer_val))
-            except Exception:
-                pass
+        correct_answer_val = self._coerce_answer(correct_answer_val)
 
-        self.randomized_params = randomized_params
-        self.evaluated_answer = correct_answer_val
+        return QuestionInstance(self, randomized_params, question_text, correct_answer_val, seed)
 
-        return question_text, correct_answer_val, randomized_params
+    def generate_question(self, rng=None, seed=None):
+        """Generate question text and evaluate numeric correct answer (replayable with a logged seed)."""
+        instance = self.instantiate(rng, seed)
+        self.randomized_params = instance.params
+        self.evaluated_answer = instance.answer
+        return instance.text, instance.answer, instance.params
 
     def calculate_answer(self, params=None):
         """Evaluate correct answer for given parameters."""
         if params is None:
             params = getattr(self, "randomized_params", {}) or {}
 
-        ans = self.correct_answer
-        if isinstance(self.correct_answer, str) and "{" in self.correct_answer:
-            try:
-                expr = self.correct_answer.format(**params)
-                ans = eval(expr, {"__builtins__": {}})
-            except Exception as e:
-                print(f"qanda.calculate_answer: failed to evaluate '{self.correct_answer}' with {params}: {e}")
-                ans = 0
+        try:
+            ans = self._evaluate_answer(params)
+        except Exception as e:
+            print(f"qanda.calculate_answer: failed to evaluate '{self.correct_answer}' with {params}: {e}")
+            ans = 0
+
+        return self._coerce_answer(ans)
 
+    def _evaluate_answer(self, params):
+        """Run the compiled answer expression, or return the literal answer."""
+        if self.answer_error:
+            raise AnswerExpressionError(self.answer_error)
+        if self.answer_expr is None:
+            return self.correct_answer
+        return self.answer_expr(params)
+
+    def _coerce_answer(self, ans):
+        """Convert to float where possible and round for integer questions."""
         try:
             ans = float(ans)
         except Exception:
@@ -105,15 +175,156 @@ class Question:
 
         return ans
 
+    def generate_batch(self, n, rng=None):
+        """
+        Generate n instances at once.
+
+        All gaussian parameters are drawn in a single (n, n_params) call and
+        the compiled answer expression is evaluated over the parameter
+        arrays. For the same seeded numpy Generator the results match n
+        successive generate_question(rng) calls.
+
+        Returns (question_texts, answers, params) where answers is an array
+        of length n and params maps each parameter name to an array.
+        """
+        params = self.sample_params(n, rng)
+        answers = self._evaluate_answer_array(params, n)
+
+        # Text formatting is inherently per instance
+        columns = {name: values.tolist() for name, values in params.items()}
+        texts = []
+        for i in range(n):
+            row = {name: values[i] for name, values in columns.items()}
+            try:
+                texts.append(self.question_text.format(**row))
+            except Exception:
+                texts.append(self.question_text)
+
+        return texts, answers, params
+
+    def sample_params(self, n, rng=None):
+        """Draw n values of every parameter at once: {name: array of length n}."""
+        if rng is None:
+            rng = np.random.default_rng()
+
+        names = list(self.params)
+        if self.randomize and names:
+            base = np.array([cfg.get("value", 0) for cfg in self.params.values()], dtype=float)
+            sd = np.array([cfg.get("sd", 0) for cfg in self.params.values()], dtype=float)
+            draws = base + sd * rng.standard_normal((n, len(names)))
+            if self.is_integer:
+                draws = np.rint(draws).astype(np.int64)
+            else:
+                draws = np.round(draws, 2)
+            params = {name: draws[:, i] for i, name in enumerate(names)}
+        else:
+            params = {name: np.full(n, self.fixed_param_value(values))
+                      for name, values in self.params.items()}
+        return params
+
+    def _evaluate_answer_array(self, params, n):
+        """Vectorised counterpart of _evaluate_answer + _coerce_answer."""
+        if self.answer_expr is None and not self.answer_error:
+            answer = self._coerce_answer(self.correct_answer)
+            if isinstance(answer, list):  # several accepted text answers
+                answers = np.empty(n, dtype=object)
+                answers[:] = [answer] * n
+                return answers
+            return np.full(n, answer)
+
+        try:
+            if self.answer_error:
+                raise AnswerExpressionError(self.answer_error)
+            answers = np.broadcast_to(self.answer_expr.evaluate_array(params), (n,)).copy()
+        except Exception as e:
+            print(f"⚠️ Error evaluating correct_answer '{self.correct_answer}': {e}")
+            answers = np.zeros(n)
+
+        # Failed evaluations become 0, as in the scalar path
+        answers[~np.isfinite(answers)] = 0
+        if self.is_integer:
+            answers = np.rint(answers).astype(np.int64)
+        return answers
+
     def check_answer(self, user_answer):
         """Compare user answer to evaluated answer."""
         correct_val = getattr(self, "evaluated_answer", self.correct_answer)
-        try:
-            user_val = float(user_answer)
-            correct = abs(user_val - float(correct_val)) < 1e-6
-        except Exception:
-            correct = str(user_answer).strip().lower() == str(correct_val).strip().lower()
-        return correct
+        return answers_match(user_answer, correct_val)
+
+
+def answers_match(user_answer, correct_val):
+    """Numeric comparison within 1e-6, falling back to case-insensitive text."""
+    if isinstance(correct_val, (list, tuple)):
+        return any(answers_match(user_answer, c) for c in correct_val)
+    try:
+        user_val = float(user_answer)
+        correct = abs(user_val - float(correct_val)) < 1e-6
+    except Exception:
+        correct = str(user_answer).strip().lower() == str(correct_val).strip().lower()
+    return correct
+
+
+class QuestionInstance:
+    """
+    One generated question: a reference to its Question template plus the
+    sampled params, rendered text and evaluated answer.
+
+    Instances are immutable and share the template, so nothing is copied
+    when a question is served. Template attributes (difficulty, image,
+    choices, question_type, ...) are read through to the template.
+    """
+
+    __slots__ = ("template", "params", "text", "answer", "seed")
+
+    def __init__(self, template, params, text, answer, seed=None):
+        object.__setattr__(self, "template", template)
+        object.__setattr__(self, "params", params)
+        object.__setattr__(self, "text", text)
+        object.__setattr__(self, "answer", answer)
+        object.__setattr__(self, "seed", seed)  # None when drawn from a shared rng
+
+    def __setattr__(self, name, value):
+        raise AttributeError("QuestionInstance is immutable")
+
+    def __getattr__(self, name):
+        # Only called for names that are not set slots
+        if name in QuestionInstance.__slots__ or name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.template, name)
+
+    def __reduce__(self):
+        return QuestionInstance, (self.template, self.params, self.text, self.answer, self.seed)
+
+    @property
+    def evaluated_answer(self):
+        return self.answer
+
+    @property
+    def randomized_params(self):
+        return self.params
+
+    def check_answer(self, user_answer):
+        return answers_match(user_answer, self.answer)
+
+    def __repr__(self):
+        return f"QuestionInstance({self.text!r}, answer={self.answer!r})"
+
+
+def _question_from_dict(q):
+    """Build a Question from one questions.json entry."""
+    return Question(
+        question_text=q.get("question", ""),
+        difficulty=q.get("difficulty", 1),
+        params=q.get("params", {}) or {},
+        randomize=q.get("randomize", False),
+        correct_answer=q.get("correct_answer", None),
+        image=q.get("image", None),
+        is_integer=q.get("is_integer", False),
+        question_type=q.get("question_type", 0),
+        choices=q.get("choices", []) or [],
+        exact_match=q.get("exact_match", False),
+        grading=q.get("grading", {}) or {}
+    )
 
 
 def load_questions_from_file(questions_path=None):
@@ -132,44 +343,167 @@ def load_questions_from_file(questions_path=None):
     for topic, qlist in raw.items():
         out_list = []
         for q in qlist:
-            qobj = Question(
-                question_text=q.get("question", ""),
-                difficulty=q.get("difficulty", 1),
-                params=q.get("params", {}) or {},
-                randomize=q.get("randomize", False),
-                correct_answer=q.get("correct_answer", None),
-                image=q.get("image", None),
-                is_integer=q.get("is_integer", False),
-                question_type=q.get("question_type", 0),
-                choices=q.get("choices", []) or [],
-                exact_match=q.get("exact_match", False)
-            )
+            qobj = _question_from_dict(q)
+            if qobj.answer_error:
+                print(f"⚠️ [{topic}] bad correct_answer for '{qobj.question_text}': {qobj.answer_error}")
             out_list.append(qobj)
         questions_data[topic] = out_list
 
     return questions_data
 
 
-def get_randomized_question(topic, difficulty=None, questions_path=None):
-    """Return (question_text, numeric_answer, question_instance)"""
-    questions_map = load_questions_from_file(questions_path)
-    questions = questions_map.get(topic, [])
-    if not questions:
-        return None, None, None
+class QuestionBank:
+    """
+    In-memory index over a parsed questions.json.
+
+    Questions are bucketed by topic and difficulty, and the widening-radius
+    candidate list for each (topic, difficulty) request is resolved once and
+    memoised, so picking a question is a dict lookup plus random.choice.
+    """
+
+    MAX_RADIUS = 10
+
+    def __init__(self, questions_map):
+        self.questions = questions_map
+        self.by_difficulty = {}
+        for topic, qlist in questions_map.items():
+            buckets = {}
+            for q in qlist:
+                buckets.setdefault(q.difficulty, []).append(q)
+            self.by_difficulty[topic] = buckets
+        self._candidates = {}
+        self._by_key = None
+
+    def topics(self):
+        return list(self.questions.keys())
+
+    def get_topic(self, topic):
+        return self.questions.get(topic, [])
+
+    def iter_questions(self):
+        """Every (topic, Question) in file order."""
+        for topic, qlist in self.questions.items():
+            for q in qlist:
+                yield topic, q
+
+    def iter_keys(self):
+        """The Question.key of every question in file order."""
+        for _, q in self.iter_questions():
+            yield q.key
+
+    def by_key(self, key):
+        """The Question whose Question.key is `key`, or None."""
+        if self._by_key is None:
+            self._by_key = {q.key: q for _, q in self.iter_questions()}
+        return self._by_key.get(key)
+
+    def candidates(self, topic, difficulty=None):
+        """Return the questions closest to `difficulty` (all questions if None)."""
+        key = (topic, difficulty)
+        cached = self._candidates.get(key)
+        if cached is not None:
+            return cached
 
-    # Choose by difficulty if possible
-    question_obj = None
-    if difficulty is not None:
-        radius = 0
-        while radius <= 10 and question_obj is None:
-            candidates = [q for q in questions if q.difficulty == difficulty - radius or q.difficulty == difficulty + radius]
-            if candidates:
-                question_obj = random.choice(candidates)
-            radius += 1
+        questions = self.questions.get(topic, [])
+        result = []
+        if difficulty is not None:
+            buckets = self.by_difficulty.get(topic, {})
+            for radius in range(self.MAX_RADIUS + 1):
+                result = buckets.get(difficulty - radius, []) + (
+                    buckets.get(difficulty + radius, []) if radius else [])
+                if result:
+                    break
+        if not result:
+            result = questions
+
+        self._candidates[key] = result
+        return result
+
+    def pick(self, topic, difficulty=None, rng=None):
+        """
+        Pick a random question template for topic, or None if it has none.
+        Draws from `rng` (a numpy Generator) when given, else from `random`.
+        """
+        candidates = self.candidates(topic, difficulty)
+        if not candidates:
+            return None
+        if rng is not None:
+            return candidates[rng.integers(len(candidates))]
+        return random.choice(candidates)
+
+
+# Process-wide cache: abspath -> (mtime_ns, size, QuestionBank)
+_bank_cache = {}
+
+
+def get_question_bank(questions_path=None):
+    """
+    Return the QuestionBank for questions_path, re-parsing the file only when
+    its mtime or size has changed since it was last loaded. A path ending in
+    .db opens a question_store.SQLiteQuestionStore instead.
+    """
+    if questions_path is None:
+        questions_path = os.path.join("trees", "questions.json")
+
+    key = os.path.abspath(questions_path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        _bank_cache.pop(key, None)
+        return QuestionBank(load_questions_from_file(questions_path))
+
+    cached = _bank_cache.get(key)
+    if cached is not None and cached[0] == st.st_mtime_ns and cached[1] == st.st_size:
+        return cached[2]
+
+    if key.endswith(".db"):
+        from question_store import SQLiteQuestionStore
+        bank = SQLiteQuestionStore(key)
+    else:
+        bank = QuestionBank(load_questions_from_file(questions_path))
+    _bank_cache[key] = (st.st_mtime_ns, st.st_size, bank)
+    return bank
+
+
+def course_questions_path(course_dir):
+    """The question bank a course serves from: questions.db if present, else questions.json."""
+    db_path = os.path.join(course_dir, "questions.db")
+    if os.path.exists(db_path):
+        return db_path
+    return os.path.join(course_dir, "questions.json")
+
+
+def text_reference_answers(bank):
+    """The reference answers of every text (question_type 2) question in a bank."""
+    answers = []
+    for _, q in bank.iter_questions():
+        if q.question_type != 2:
+            continue
+        if isinstance(q.correct_answer, list):
+            answers.extend(a for a in q.correct_answer if isinstance(a, str) and a)
+        elif isinstance(q.correct_answer, str) and q.correct_answer:
+            answers.append(q.correct_answer)
+    return answers
+
+
+def clear_question_cache(questions_path=None):
+    """
+    Drop one cached bank (or all of them when no path is given). A dropped
+    store is not closed: a prefetch thread may still be reading from it, and
+    its connection closes once the last user lets go of it.
+    """
+    if questions_path is None:
+        _bank_cache.clear()
+    else:
+        _bank_cache.pop(os.path.abspath(questions_path), None)
+
+
+def get_randomized_question(topic, difficulty=None, questions_path=None, seed=None):
+    """Return (question_text, numeric_answer, question_instance), drawn from a new seed unless one is given."""
+    bank = get_question_bank(questions_path)
+    question_obj = bank.pick(topic, difficulty)
     if question_obj is None:
-        question_obj = random.choice(questions)
+        return None, None, None
 
-    question_instance = copy.deepcopy(question_obj)
-    q_text, numeric_answer, params = question_instance.generate_question()
-    question_instance.randomized_params = params
-    return q_text, numeric_answer, question_instance
+    question_instance = question_obj.instantiate(seed=new_seed() if seed is None else seed)
+    return question_instance.text, question_instance.answer, question_instance
@@ -0,0 +1,78 @@
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+from qanda import get_randomized_question
+
+# A question instance that is ready to show: text, answer, instance and scaled image (or None)
+PreparedQuestion = namedtuple("PreparedQuestion", ["difficulty", "text", "answer", "instance", "image"])
+
+
+class QuestionPrefetcher:
+    """
+    Prepares the next few questions for one topic on a worker thread.
+
+    Each prepared item is generated for a specific difficulty. Asking for a
+    different difficulty than the one being prefetched throws the stale
+    items away and starts again.
+    """
+
+    def __init__(self, topic, questions_path, images_dir, depth=2, image_size=(400, 300)):
+        self.topic = topic
+        self.questions_path = questions_path
+        self.images_dir = images_dir
+        self.depth = depth
+        self.image_size = image_size
+        self.difficulty = None
+        self._pending = deque()
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def prefetch(self, difficulty):
+        """Keep `depth` questions of this difficulty in flight."""
+        if difficulty != self.difficulty:
+            self.discard()
+            self.difficulty = difficulty
+        while len(self._pending) < self.depth:
+            self._pending.append(self._executor.submit(self._prepare, difficulty))
+
+    def take(self, difficulty):
+        """Return a PreparedQuestion, from the queue if one matches, else built now."""
+        if difficulty == self.difficulty and self._pending:
+            prepared = self._pending.popleft().result()
+        else:
+            prepared = self._prepare(difficulty)
+        self.prefetch(difficulty)
+        return prepared
+
+    def discard(self):
+        """Drop every prefetched item."""
+        while self._pending:
+            self._pending.popleft().cancel()
+        self.difficulty = None
+
+    def shutdown(self):
+        self.discard()
+        self._executor.shutdown(wait=False)
+
+    def _prepare(self, difficulty):
+        question_text, numeric_answer, question_instance = get_randomized_question(
+            self.topic,
+            difficulty=difficulty,
+            questions_path=self.questions_path
+        )
+
+        # QImage (unlike QPixmap) may be decoded and scaled off the GUI thread
+        image = None
+        img_filename = getattr(question_instance, "image", None)
+        if img_filename:
+            img_path = os.path.join(self.images_dir, img_filename)
+            if os.path.exists(img_path):
+                image = QImage(img_path).scaled(
+                    self.image_size[0], self.image_size[1],
+                    Qt.KeepAspectRatio, Qt.SmoothTransformation
+                )
+
+        return PreparedQuestion(difficulty, question_text, numeric_answer, question_instance, image)
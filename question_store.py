@@ -0,0 +1,252 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+from collections import OrderedDict
+
+from qanda import QuestionBank, _question_from_dict
+
+
+class SQLiteQuestionStore:
+    """
+    Question bank stored in SQLite instead of a single questions.json.
+
+    Rows keep the original JSON of each question, so a course can be
+    exported back to questions.json unchanged. Each (topic, difficulty)
+    bucket numbers its rows 0..n-1 in `slot`, which makes a random pick a
+    single indexed lookup. Only the per-topic bucket sizes and a small LRU
+    of built Question objects are held in memory, so opening a course and
+    serving questions cost the same at any bank size.
+
+    Provides the same topics()/get_topic()/pick()/iter_questions()/iter_keys()/by_key()
+    interface as qanda.QuestionBank. Tools that visit every question should
+    use iter_questions(), which streams, rather than get_topic().
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS topics (
+            name TEXT PRIMARY KEY,
+            position INTEGER NOT NULL
+        );
+        CREATE TABLE IF NOT EXISTS questions (
+            id INTEGER PRIMARY KEY,
+            topic TEXT NOT NULL,
+            position INTEGER NOT NULL,
+            difficulty INTEGER NOT NULL,
+            slot INTEGER NOT NULL,
+            data TEXT NOT NULL,
+            key TEXT NOT NULL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_questions_bucket
+            ON questions (topic, difficulty, slot);
+        CREATE INDEX IF NOT EXISTS idx_questions_position
+            ON questions (topic, position);
+        CREATE INDEX IF NOT EXISTS idx_questions_key
+            ON questions (key);
+    """
+
+    MAX_RADIUS = QuestionBank.MAX_RADIUS
+    PAGE_SIZE = 256  # rows iter_questions() / iter_keys() read at a time
+
+    def __init__(self, db_path, cache_size=512):
+        self.db_path = db_path
+        self.cache_size = cache_size
+        # The prefetcher reads from a worker thread, so share one guarded connection
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.executescript(self.SCHEMA)
+        self._bucket_sizes = {}
+        self._questions = OrderedDict()
+
+    # --------------------
+    # Reading
+    # --------------------
+    def topics(self):
+        with self._lock:
+            rows = self._conn.execute("SELECT name FROM topics ORDER BY position").fetchall()
+        return [r[0] for r in rows]
+
+    def get_topic(self, topic):
+        """Materialise every question of one topic, in file order."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, data FROM questions WHERE topic = ? ORDER BY position", (topic,)
+            ).fetchall()
+        return [self._build(qid, data) for qid, data in rows]
+
+    def iter_questions(self):
+        """
+        Every (topic, Question) in file order, read a page at a time so only
+        PAGE_SIZE rows are held at once (and the LRU is left alone).
+        """
+        for topic in self.topics():
+            position = -1
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT position, data FROM questions WHERE topic = ? AND position > ? "
+                        "ORDER BY position LIMIT ?", (topic, position, self.PAGE_SIZE)).fetchall()
+                if not rows:
+                    break
+                for position, data in rows:
+                    yield topic, _question_from_dict(json.loads(data))
+
+    def iter_keys(self):
+        """The Question.key of every question in file order, read from the key column a page at a time."""
+        for topic in self.topics():
+            position = -1
+            while True:
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT position, key FROM questions WHERE topic = ? AND position > ? "
+                        "ORDER BY position LIMIT ?", (topic, position, self.PAGE_SIZE)).fetchall()
+                if not rows:
+                    break
+                for position, key in rows:
+                    yield key
+
+    def by_key(self, key):
+        """The Question whose Question.key is `key`, or None (one indexed lookup)."""
+        with self._lock:
+            row = self._conn.execute("SELECT id, data FROM questions WHERE key = ? LIMIT 1", (key,)).fetchone()
+        return self._build(*row) if row else None
+
+    def bucket_sizes(self, topic):
+        """{difficulty: number of questions} for a topic, loaded once per topic."""
+        with self._lock:
+            sizes = self._bucket_sizes.get(topic)
+            if sizes is None:
+                sizes = dict(self._conn.execute(
+                    "SELECT difficulty, COUNT(*) FROM questions WHERE topic = ? GROUP BY difficulty",
+                    (topic,)
+                ).fetchall())
+                self._bucket_sizes[topic] = sizes
+            return sizes
+
+    def candidate_difficulties(self, topic, difficulty=None):
+        """Difficulties of the buckets a pick would draw from (all of them if None)."""
+        sizes = self.bucket_sizes(topic)
+        if difficulty is not None:
+            for radius in range(self.MAX_RADIUS + 1):
+                found = [d for d in {difficulty - radius, difficulty + radius} if sizes.get(d)]
+                if found:
+                    return found
+        return list(sizes)
+
+    def pick(self, topic, difficulty=None, rng=None):
+        """
+        Pick a random question template for topic, or None if it has none.
+        Draws from `rng` (a numpy Generator) when given, else from `random`.
+        """
+        sizes = self.bucket_sizes(topic)
+        buckets = self.candidate_difficulties(topic, difficulty)
+        total = sum(sizes[d] for d in buckets)
+        if not total:
+            return None
+
+        # Choose uniformly over all questions in the candidate buckets
+        index = int(rng.integers(total)) if rng is not None else random.randrange(total)
+        for d in buckets:
+            if index < sizes[d]:
+                break
+            index -= sizes[d]
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT id, data FROM questions WHERE topic = ? AND difficulty = ? AND slot = ?",
+                (topic, d, index)
+            ).fetchone()
+        return self._build(*row) if row else None
+
+    def _build(self, qid, data):
+        # The LRU is shared with the prefetch thread, so every use of it holds the lock
+        with self._lock:
+            question = self._questions.get(qid)
+            if question is not None:
+                self._questions.move_to_end(qid)
+                return question
+        question = _question_from_dict(json.loads(data))
+        with self._lock:
+            question = self._questions.setdefault(qid, question)
+            self._questions.move_to_end(qid)
+            if len(self._questions) > self.cache_size:
+                self._questions.popitem(last=False)
+        return question
+
+    # --------------------
+    # JSON import / export
+    # --------------------
+    def import_json(self, questions_path):
+        """Replace the store's contents with questions.json."""
+        with open(questions_path, "r", encoding="utf-8") as f:
+            raw = json.load(f)
+
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM questions")
+            self._conn.execute("DELETE FROM topics")
+            for t_pos, (topic, qlist) in enumerate(raw.items()):
+                self._conn.execute("INSERT INTO topics (name, position) VALUES (?, ?)", (topic, t_pos))
+                slots = {}
+                rows = []
+                for q_pos, q in enumerate(qlist):
+                    difficulty = int(q.get("difficulty", 1))
+                    slot = slots.get(difficulty, 0)
+                    slots[difficulty] = slot + 1
+                    rows.append((topic, q_pos, difficulty, slot, json.dumps(q), _question_from_dict(q).key))
+                self._conn.executemany(
+                    "INSERT INTO questions (topic, position, difficulty, slot, data, key) VALUES (?, ?, ?, ?, ?, ?)",
+                    rows
+                )
+            self._bucket_sizes.clear()
+            self._questions.clear()
+
+    def export_json(self, questions_path):
+        """Write the store back out in the questions.json format, one topic at a time."""
+        with open(questions_path, "w", encoding="utf-8") as f:
+            f.write("{")
+            for t_index, topic in enumerate(self.topics()):
+                f.write("," if t_index else "")
+                f.write(f"\n  {json.dumps(topic)}: [")
+                with self._lock:
+                    cursor = self._conn.execute(
+                        "SELECT data FROM questions WHERE topic = ? ORDER BY position", (topic,)
+                    )
+                    for q_index, (data,) in enumerate(cursor):
+                        body = json.dumps(json.loads(data), indent=2).replace("\n", "\n    ")
+                        f.write(("," if q_index else "") + "\n    " + body)
+                f.write("\n  ]")
+            f.write("\n}\n")
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def import_course(course_dir):
+    """Build (or rebuild) questions.db from a course's questions.json."""
+    store = SQLiteQuestionStore(os.path.join(course_dir, "questions.db"))
+    store.import_json(os.path.join(course_dir, "questions.json"))
+    store.close()
+
+
+def export_course(course_dir):
+    """Write a course's questions.db back to questions.json."""
+    store = SQLiteQuestionStore(os.path.join(course_dir, "questions.db"))
+    store.export_json(os.path.join(course_dir, "questions.json"))
+    store.close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Convert a course between questions.json and questions.db")
+    parser.add_argument("action", choices=["import", "export"])
+    parser.add_argument("course_dir")
+    args = parser.parse_args()
+
+    if args.action == "import":
+        import_course(args.course_dir)
+    else:
+        export_course(args.course_dir)
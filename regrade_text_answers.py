@@ -0,0 +1,135 @@
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from attempt_store import load_history, write_history, load_text_answers, update_text_answers
+from grading import format_references, parse_references
+from progress_db import ProgressDB, PROGRESS_DB
+from nlp_utils import (get_text_similarities, lexical_grade, SIMILARITY_THRESHOLD, LEXICAL_ACCEPT,
+                       LEXICAL_REJECT, STAGE_EXACT, STAGE_MODEL, embedding_id)
+from qanda import get_question_bank, course_questions_path
+
+
+def recompute_streaks(correct):
+    """Consecutive-correct counts for a 0/1 array, as store_user_data computes them row by row."""
+    correct = np.asarray(correct, dtype=np.int64)
+    positions = np.arange(1, len(correct) + 1)
+    # Index of the last wrong answer at or before each row
+    last_reset = np.maximum.accumulate(np.where(correct == 0, positions, 0))
+    return np.where(correct == 1, positions - last_reset, 0)
+
+
+def grading_options(course_dir):
+    """{reference answer: per-question grading overrides} for a course's text questions."""
+    try:
+        bank = get_question_bank(course_questions_path(course_dir))
+    except (OSError, ValueError):
+        return {}
+    return {
+        format_references(q.correct_answer): q.grading
+        for _, q in bank.iter_questions()
+        if q.question_type == 2 and q.grading
+    }
+
+
+def regrade_course(course_dir, threshold=SIMILARITY_THRESHOLD, batch_size=64, dry_run=False,
+                   db=None, learner_id=None):
+    """
+    Re-grade a course's stored text answers (every learner's, or one
+    learner's) with the grading cascade (current lexical bands, model and
+    threshold), then update them and their attempts in the progress
+    database (similarity, correctness, streaks and topic stats). Returns
+    the number of answers whose correctness changed.
+    """
+    db = db or ProgressDB(PROGRESS_DB)
+    course = os.path.basename(os.path.normpath(course_dir))
+    answers = pd.DataFrame(load_text_answers(db, course, learner_id))
+    if answers.empty:
+        print(f"No stored text answers for {course}; nothing to re-grade.")
+        return 0
+
+    answers["answer"] = answers["answer"].fillna("").astype(str)
+    exact = answers["exact_match"].astype(int).to_numpy() == 1
+    references = [parse_references(r) for r in answers["reference"]]
+
+    # Exact-match answers keep their grade; the rest go through the lexical
+    # stages, and only the undecided ones through the model in batches
+    options = grading_options(course_dir)
+    old_correct = answers["correct"].astype(int).to_numpy()
+    similarity = answers["similarity"].to_numpy(dtype=float, na_value=0.0, copy=True)
+    correct = old_correct.copy()
+    stages = np.full(len(answers), STAGE_MODEL, dtype=object)
+    stages[exact] = STAGE_EXACT
+    thresholds = np.full(len(answers), threshold, dtype=float)
+    ambiguous = np.zeros(len(answers), dtype=bool)
+    for i in np.flatnonzero(~exact):
+        answer, reference = answers.at[i, "answer"], references[i]
+        question = options.get(answers.at[i, "reference"], {})
+        thresholds[i] = question.get("threshold", threshold)
+        grade = lexical_grade(answer, reference,
+                              question.get("lexical_accept", LEXICAL_ACCEPT),
+                              question.get("lexical_reject", LEXICAL_REJECT))
+        if grade is None:
+            ambiguous[i] = True
+        else:
+            similarity[i], correct[i], stages[i] = grade
+
+    if ambiguous.any():
+        similarity[ambiguous] = get_text_similarities(
+            answers.loc[ambiguous, "answer"].tolist(),
+            [references[i] for i in np.flatnonzero(ambiguous)],
+            batch_size=batch_size
+        )
+        correct[ambiguous] = similarity[ambiguous] >= thresholds[ambiguous]
+    n_changed = int(np.count_nonzero(correct != old_correct))
+
+    print(f"Re-graded {len(answers)} text answers with {embedding_id()} at threshold {threshold}: "
+          f"{n_changed} changed correctness, {int(ambiguous.sum())} needed the model")
+    if dry_run:
+        return n_changed
+
+    answers["similarity"] = similarity
+    answers["correct"] = correct
+    answers["stage"] = stages
+    update_text_answers(db, course, answers.to_dict("records"))
+
+    # Each learner's attempt rows, streaks and topic stats follow their re-graded answers.
+    # Read and rewrite under one write lock so attempts a live session writes meanwhile
+    # are not dropped from the stats.
+    for learner, rows in answers.groupby("learner_id").groups.items():
+        with db.transaction() as conn:
+            history = load_history(db, int(learner), course, conn=conn)
+            if not len(history):
+                continue
+            attempts = answers.loc[rows, "attempt"].astype(int).to_numpy()
+            in_range = attempts < len(history)
+            attempts, rows = attempts[in_range], np.asarray(rows)[in_range]
+            history["submitted_answer"][attempts] = np.where(exact[rows], correct[rows], similarity[rows])
+            history["correct_answer"][attempts] = correct[rows]
+            history["correct"][attempts] = correct[rows]
+            history["correct_streak"] = recompute_streaks(history["correct"])
+            write_history(db, int(learner), course, history, conn)
+
+    return n_changed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-grade a course's stored text answers in batches")
+    parser.add_argument("course_dir")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--dry-run", action="store_true", help="Report changes without writing")
+    parser.add_argument("--learner", help="Only re-grade this learner's answers")
+    parser.add_argument("--db", default=PROGRESS_DB)
+    args = parser.parse_args()
+
+    progress_db = ProgressDB(args.db)
+    learner_id = None
+    if args.learner:
+        learner_id = progress_db.learner_id(args.learner)
+        if learner_id is None:
+            parser.error(f"no learner named '{args.learner}'")
+    regrade_course(args.course_dir, threshold=args.threshold, batch_size=args.batch_size,
+                   dry_run=args.dry_run, db=progress_db, learner_id=learner_id)
@@ -0,0 +1,59 @@
+import argparse
+import os
+
+from attempt_store import load_history, NO_SEED
+from course_compiler import CourseIds
+from progress_db import ProgressDB, PROGRESS_DB
+from qanda import get_question_bank, course_questions_path
+
+
+def replay_history(course_dir, db, learner_id, attempts=None):
+    """
+    Regenerate the question instances a learner was shown from the logged
+    (question_id, seed) pairs. Returns [(attempt, instance or None, note)];
+    an attempt cannot be replayed if it has no seed or its question has
+    since been edited or removed.
+    """
+    course = os.path.basename(os.path.normpath(course_dir))
+    ids = CourseIds(db, course)  # only looks ids up: replaying never interns
+    bank = get_question_bank(course_questions_path(course_dir))
+
+    history = load_history(db, learner_id, course)
+    if attempts is None:
+        attempts = range(len(history))
+
+    replayed = []
+    for attempt in attempts:
+        if not 0 <= attempt < len(history):
+            replayed.append((attempt, None, "no such attempt"))
+            continue
+        row = history[attempt]
+        key = ids.question_key(int(row["question_id"]))
+        template = None if key is None else bank.by_key(key)
+        if int(row["seed"]) == NO_SEED:
+            replayed.append((attempt, None, "no seed logged"))
+        elif template is None:
+            replayed.append((attempt, None, "question changed or removed since"))
+        else:
+            replayed.append((attempt, template.instantiate(seed=int(row["seed"])), ""))
+    return replayed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show the exact questions a learner was asked")
+    parser.add_argument("course_dir")
+    parser.add_argument("--learner", required=True)
+    parser.add_argument("--attempt", type=int, nargs="+", help="Attempt numbers to replay (default: all)")
+    parser.add_argument("--db", default=PROGRESS_DB)
+    args = parser.parse_args()
+
+    progress_db = ProgressDB(args.db)
+    learner_id = progress_db.learner_id(args.learner)
+    if learner_id is None:
+        parser.error(f"no learner named '{args.learner}'")
+
+    for attempt, instance, note in replay_history(args.course_dir, progress_db, learner_id, args.attempt):
+        if instance is None:
+            print(f"⚠️ #{attempt}: {note}")
+        else:
+            print(f"#{attempt}: {instance.text}  [answer: {instance.answer}]")